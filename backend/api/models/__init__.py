@@ -1,11 +1,14 @@
+from ._db import db
 from .user import User
 from .inventory import InventoryItem, Category, Location
 from .purchase_order import PurchaseOrder, PurchaseOrderItem
 from .supplier import Supplier
 from .audit_log import AuditLog
 from .notification import Notification
+from .counter import DocumentCounter
 
 __all__ = [
+    'db',
     'User',
     'InventoryItem',
     'Category', 
@@ -14,5 +17,6 @@ __all__ = [
     'PurchaseOrderItem',
     'Supplier',
     'AuditLog',
-    'Notification'
+    'Notification',
+    'DocumentCounter'
 ] 
\ No newline at end of file
@@ -0,0 +1,23 @@
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, DDL
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Single SQLAlchemy instance shared by every model, so they share one
+# metadata, one registry and one session.
+# Model methods only stage changes on db.session; the calling route/service
+# owns the transaction and does a single commit (or rollback on error).
+db = SQLAlchemy()
+
+# Trigram (gin_trgm_ops) indexes need the pg_trgm extension before any table is created
+event.listen(
+    db.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+def dialect_insert(table):
+    """INSERT construct with on_conflict_* support for the bound dialect (SQLite in tests)"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return sqlite_insert(table)
+    return postgresql_insert(table)
@@ -1,7 +1,8 @@
-from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timezone
+from sqlalchemy.sql import func
+from sqlalchemy.orm import raiseload, selectinload
 
-db = SQLAlchemy()
+from ._db import db
 
 class AuditLog(db.Model):
     """Audit Log model for tracking all system activities"""
@@ -17,16 +18,27 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45))  # IPv4 or IPv6 address
     user_agent = db.Column(db.Text)  # Browser/device information
     notes = db.Column(db.Text)  # Additional notes
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
     
-    # Relationships
-    user = db.relationship('User', backref='audit_logs')
+    __table_args__ = (
+        # Each ends in (created_at, id) DESC: rows written in one transaction share created_at,
+        # so id breaks the tie for search_activity's keyset cursor
+        # Serves get_user_activity: range scan on user_id, already ordered by created_at
+        db.Index('ix_audit_logs_user_created', user_id, created_at.desc(), id.desc()),
+        # Serves get_table_activity and per-record history lookups
+        db.Index('ix_audit_logs_table_record_created', table_name, record_id, created_at.desc(), id.desc()),
+        # Serves get_activity_by_action
+        db.Index('ix_audit_logs_action_created', action, created_at.desc(), id.desc()),
+        # Serves get_recent_activity's global newest-first listing
+        db.Index('ix_audit_logs_created', created_at.desc(), id.desc()),
+        # Trigram indexes (PostgreSQL pg_trgm) for search_activity's '%q%' ILIKE filters
+        db.Index('ix_audit_logs_notes_trgm', notes, postgresql_using='gin', postgresql_ops={'notes': 'gin_trgm_ops'}),
+        db.Index('ix_audit_logs_old_value_trgm', old_value, postgresql_using='gin', postgresql_ops={'old_value': 'gin_trgm_ops'}),
+        db.Index('ix_audit_logs_new_value_trgm', new_value, postgresql_using='gin', postgresql_ops={'new_value': 'gin_trgm_ops'}),
+    )
     
-    def __init__(self, **kwargs):
-        super(AuditLog, self).__init__(**kwargs)
-        # Set default values if not provided
-        if not self.created_at:
-            self.created_at = datetime.utcnow()
+    # Relationships
+    user = db.relationship('User', back_populates='audit_logs')
     
     def to_dict(self):
         """Convert audit log to dictionary"""
@@ -41,7 +53,7 @@ class AuditLog(db.Model):
             'ip_address': self.ip_address,
             'user_agent': self.user_agent,
             'notes': self.notes,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
     
     @staticmethod
@@ -60,20 +72,24 @@ class AuditLog(db.Model):
             notes=notes
         )
         db.session.add(audit_log)
-        db.session.commit()
         return audit_log
     
+    @staticmethod
+    def _list_query():
+        """Base query for list helpers: users eager-loaded, any other lazy load raises"""
+        return AuditLog.query.options(selectinload(AuditLog.user), raiseload('*'))
+    
     @staticmethod
     def get_user_activity(user_id, limit=50):
         """Get activity for a specific user"""
-        return AuditLog.query.filter_by(user_id=user_id).order_by(
+        return AuditLog._list_query().filter_by(user_id=user_id).order_by(
             AuditLog.created_at.desc()
         ).limit(limit).all()
     
     @staticmethod
     def get_table_activity(table_name, record_id=None, limit=50):
         """Get activity for a specific table or record"""
-        query = AuditLog.query.filter_by(table_name=table_name)
+        query = AuditLog._list_query().filter_by(table_name=table_name)
         if record_id:
             query = query.filter_by(record_id=record_id)
         
@@ -82,12 +98,14 @@ class AuditLog(db.Model):
     @staticmethod
     def get_recent_activity(limit=100):
         """Get recent activity across all tables"""
-        return AuditLog.query.order_by(AuditLog.created_at.desc()).limit(limit).all()
+        return AuditLog._list_query().order_by(
+            AuditLog.created_at.desc()
+        ).limit(limit).all()
     
     @staticmethod
     def get_activity_by_action(action, limit=50):
         """Get activity by specific action"""
-        return AuditLog.query.filter_by(action=action).order_by(
+        return AuditLog._list_query().filter_by(action=action).order_by(
             AuditLog.created_at.desc()
         ).limit(limit).all()
     
@@ -96,38 +114,50 @@ class AuditLog(db.Model):
         """Get activity summary for the last N days"""
         from datetime import timedelta
         
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_date = datetime.now(timezone.utc) - timedelta(days=days)
         
-        # Get activity counts by action
-        action_counts = db.session.query(
-            AuditLog.action,
-            db.func.count(AuditLog.id)
-        ).filter(AuditLog.created_at >= start_date).group_by(AuditLog.action).all()
+        # One round trip: the three GROUP BYs share a filtered CTE and are UNION ALL'd,
+        # each row tagged with the summary it belongs to
+        base = db.select(
+            AuditLog.action, AuditLog.table_name, AuditLog.user_id
+        ).where(AuditLog.created_at >= start_date).cte('base')
         
-        # Get activity counts by table
-        table_counts = db.session.query(
-            AuditLog.table_name,
-            db.func.count(AuditLog.id)
-        ).filter(AuditLog.created_at >= start_date).group_by(AuditLog.table_name).all()
+        summary = db.union_all(
+            db.select(db.literal('action'), db.cast(base.c.action, db.String), db.func.count())
+            .group_by(base.c.action),
+            db.select(db.literal('table'), db.cast(base.c.table_name, db.String), db.func.count())
+            .group_by(base.c.table_name),
+            db.select(db.literal('user'), db.cast(base.c.user_id, db.String), db.func.count())
+            .group_by(base.c.user_id)
+        )
         
-        # Get user activity counts
-        user_counts = db.session.query(
-            AuditLog.user_id,
-            db.func.count(AuditLog.id)
-        ).filter(AuditLog.created_at >= start_date).group_by(AuditLog.user_id).all()
+        action_counts, table_counts, user_counts = {}, {}, {}
+        for kind, value, count in db.session.execute(summary):
+            if kind == 'action':
+                action_counts[value] = count
+            elif kind == 'table':
+                table_counts[value] = count
+            else:
+                user_counts[int(value)] = count
         
         return {
             'period_days': days,
             'start_date': start_date.isoformat(),
-            'action_counts': dict(action_counts),
-            'table_counts': dict(table_counts),
-            'user_counts': dict(user_counts)
+            'action_counts': action_counts,
+            'table_counts': table_counts,
+            'user_counts': user_counts
         }
     
     @staticmethod
-    def search_activity(query, start_date=None, end_date=None, user_id=None, action=None, table_name=None):
-        """Search audit logs with filters"""
-        search = AuditLog.query
+    def search_activity(query, start_date=None, end_date=None, user_id=None, action=None, table_name=None,
+                        limit=100, cursor=None):
+        """Search audit logs with filters, one keyset page at a time
+        
+        Returns (rows, next_cursor). Pass next_cursor back as cursor to get the
+        following (older) page; it is the last row's (created_at, id), or None when
+        the page came back empty.
+        """
+        search = AuditLog._list_query()
         
         if query:
             search = search.filter(
@@ -153,7 +183,11 @@ class AuditLog(db.Model):
         if table_name:
             search = search.filter(AuditLog.table_name == table_name)
         
-        return search.order_by(AuditLog.created_at.desc()).all()
+        if cursor:
+            search = search.filter(db.tuple_(AuditLog.created_at, AuditLog.id) < tuple(cursor))
+        
+        rows = search.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit).all()
+        return rows, (rows[-1].created_at, rows[-1].id) if rows else None
     
     def __repr__(self):
-        return f'<AuditLog {self.action} on {self.table_name} by user {self.user_id}>' 
\ No newline at end of file
+        return f'<AuditLog {self.action} on {self.table_name} by user {self.user_id}>'
\ No newline at end of file
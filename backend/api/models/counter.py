@@ -0,0 +1,49 @@
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from ._db import db
+
+class DocumentCounter(db.Model):
+    """Per-period counters backing generated document numbers (PO numbers, supplier codes)"""
+    __tablename__ = 'document_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)  # po_number, supplier_code, ...
+    period = db.Column(db.String(10), primary_key=True)  # e.g. 202401 for monthly, 2024 for yearly
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    @staticmethod
+    def next_value(name, period, seed=None):
+        """Atomically increment and return the counter for name/period
+        
+        The row stays locked until the caller's transaction ends, so concurrent
+        callers get distinct values. On first use of a period the counter starts
+        after seed() (if given), which lets it take over from numbers issued before
+        the counter existed.
+        
+        Runs without flushing the session: it is called from model constructors,
+        where a half-built pending object would otherwise be flushed early.
+        """
+        table = DocumentCounter.__table__
+        increment = update(table).where(
+            table.c.name == name,
+            table.c.period == period
+        ).values(value=table.c.value + 1).returning(table.c.value)
+        
+        with db.session.no_autoflush:
+            value = db.session.execute(increment).scalar()
+            if value is not None:
+                return value
+            
+            value = (seed() if seed else 0) + 1
+            # Connection-level savepoint: Session.begin_nested() would flush first
+            connection = db.session.connection()
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(table).values(name=name, period=period, value=value))
+                return value
+            except IntegrityError:
+                # Another transaction created the row first
+                return db.session.execute(increment).scalar()
+    
+    def __repr__(self):
+        return f'<DocumentCounter {self.name} {self.period}: {self.value}>'
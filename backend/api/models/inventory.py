@@ -1,12 +1,41 @@
-from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update, bindparam, and_, case
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import func
 import qrcode
+import functools
 import io
 import base64
 
-db = SQLAlchemy()
+from ._db import db, dialect_insert
+
+@functools.lru_cache(maxsize=4096)
+def _qr_png_for_sku(sku):
+    """Render the QR code PNG for a SKU; the image depends only on the SKU, so cache it"""
+    qr = qrcode.QRCode(box_size=4, border=2)
+    qr.add_data(f'INVENTORY:{sku}')
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+def _qr_for_sku(sku):
+    return 'data:image/png;base64,' + base64.b64encode(_qr_png_for_sku(sku)).decode('ascii')
+
+def _stock_status(quantity, reorder_level):
+    """Stock status label shared by InventoryItem.status and iter_summaries"""
+    if quantity <= 0:
+        return 'out_of_stock'
+    elif quantity <= reorder_level:
+        return 'low_stock'
+    return 'in_stock'
+
+def _search_text(name, sku, description):
+    """name, sku and description as one string; ix_inv_search_trgm and search_filter
+    must build the identical expression for the planner to use the index"""
+    return func.coalesce(name, '') + ' ' + sku + ' ' + func.coalesce(description, '')
 
 class Category(db.Model):
     """Category model for organizing inventory items"""
@@ -16,22 +45,26 @@ class Category(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relationships
-    items = db.relationship('InventoryItem', backref='category', lazy='dynamic')
+    items = db.relationship('InventoryItem', backref='category')
     
-    def to_dict(self):
-        """Convert category to dictionary"""
+    def to_dict(self, item_count=None):
+        """Convert category to dictionary
+        
+        Pass item_count when it was already aggregated (see get_active_categories_with_counts);
+        otherwise it is counted with one COUNT query. Either way only active items count.
+        """
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'is_active': self.is_active,
-            'item_count': self.items.count(),
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'item_count': self.active_item_count() if item_count is None else item_count,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     @staticmethod
@@ -39,6 +72,26 @@ class Category(db.Model):
         """Get all active categories"""
         return Category.query.filter_by(is_active=True).all()
     
+    @staticmethod
+    def get_active_categories_with_counts():
+        """Get active categories with their active item counts in one grouped query
+        
+        Returns a list of (category, item_count) tuples.
+        """
+        return db.session.query(Category, func.count(InventoryItem.id)).outerjoin(
+            InventoryItem,
+            and_(InventoryItem.category_id == Category.id, InventoryItem.is_active == True)
+        ).filter(Category.is_active == True).group_by(Category.id).all()
+    
+    def active_item_count(self):
+        """Number of active items in this category, counted in SQL without loading them"""
+        return db.session.scalar(
+            db.select(func.count(InventoryItem.id)).where(
+                InventoryItem.category_id == self.id,
+                InventoryItem.is_active == True
+            )
+        )
+    
     def __repr__(self):
         return f'<Category {self.name}>'
 
@@ -53,14 +106,18 @@ class Location(db.Model):
     contact_person = db.Column(db.String(100))
     contact_phone = db.Column(db.String(20))
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relationships
-    items = db.relationship('InventoryItem', backref='location', lazy='dynamic')
+    items = db.relationship('InventoryItem', backref='location')
     
-    def to_dict(self):
-        """Convert location to dictionary"""
+    def to_dict(self, item_count=None):
+        """Convert location to dictionary
+        
+        Pass item_count when it was already aggregated (see get_active_locations_with_counts);
+        otherwise it is counted with one COUNT query. Either way only active items count.
+        """
         return {
             'id': self.id,
             'name': self.name,
@@ -69,9 +126,9 @@ class Location(db.Model):
             'contact_person': self.contact_person,
             'contact_phone': self.contact_phone,
             'is_active': self.is_active,
-            'item_count': self.items.count(),
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'item_count': self.active_item_count() if item_count is None else item_count,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     @staticmethod
@@ -79,6 +136,26 @@ class Location(db.Model):
         """Get all active locations"""
         return Location.query.filter_by(is_active=True).all()
     
+    @staticmethod
+    def get_active_locations_with_counts():
+        """Get active locations with their active item counts in one grouped query
+        
+        Returns a list of (location, item_count) tuples.
+        """
+        return db.session.query(Location, func.count(InventoryItem.id)).outerjoin(
+            InventoryItem,
+            and_(InventoryItem.location_id == Location.id, InventoryItem.is_active == True)
+        ).filter(Location.is_active == True).group_by(Location.id).all()
+    
+    def active_item_count(self):
+        """Number of active items in this location, counted in SQL without loading them"""
+        return db.session.scalar(
+            db.select(func.count(InventoryItem.id)).where(
+                InventoryItem.location_id == self.id,
+                InventoryItem.is_active == True
+            )
+        )
+    
     def __repr__(self):
         return f'<Location {self.name}>'
 
@@ -101,13 +178,36 @@ class InventoryItem(db.Model):
     image_url = db.Column(db.String(255))
     is_active = db.Column(db.Boolean, default=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Partial indexes (PostgreSQL) covering only the rows the dashboard alerts read,
+        # keyed in iter_summaries' (name, id) order so the lists need no sort
+        db.Index('ix_inv_low_stock', name, id, postgresql_where=db.text('is_active AND quantity <= reorder_level')),
+        db.Index('ix_inv_oos', name, id, postgresql_where=db.text('is_active AND quantity = 0')),
+        # One trigram index (PostgreSQL pg_trgm) over the text search_filter matches, so a
+        # '%q%' ILIKE is a single index scan instead of a BitmapOr of three
+        db.Index('ix_inv_search_trgm', _search_text(name, sku, description).label('search_text'),
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        # max(updated_at) for get_export_version reads the end of this index
+        db.Index('ix_inv_updated_at', updated_at),
+        # Keyset pagination of the active item list (WHERE is_active AND (name, id) > cursor ORDER BY name, id)
+        db.Index('ix_inv_active_name_id', is_active, name, id),
+    )
     
     # Relationships
     created_by_user = db.relationship('User', backref='created_items')
-    supplier = db.relationship('Supplier', backref='items')
-    audit_logs = db.relationship('AuditLog', backref='inventory_item', lazy='dynamic')
+    supplier = db.relationship('Supplier', back_populates='inventory_items')
+    # audit_logs has no FK to inventory_items; read history through the indexed
+    # AuditLog.get_table_activity('inventory_items', item.id) instead of loading this
+    audit_logs = db.relationship(
+        'AuditLog',
+        primaryjoin="and_(foreign(AuditLog.record_id) == InventoryItem.id, "
+                    "AuditLog.table_name == 'inventory_items')",
+        viewonly=True,
+        lazy='raise'
+    )
     
     @hybrid_property
     def total_value(self):
@@ -117,12 +217,7 @@ class InventoryItem(db.Model):
     @hybrid_property
     def status(self):
         """Get inventory status based on quantity"""
-        if self.quantity <= 0:
-            return 'out_of_stock'
-        elif self.quantity <= self.reorder_level:
-            return 'low_stock'
-        else:
-            return 'in_stock'
+        return _stock_status(self.quantity, self.reorder_level)
     
     @hybrid_property
     def needs_reorder(self):
@@ -134,8 +229,8 @@ class InventoryItem(db.Model):
         if quantity <= 0:
             raise ValueError("Quantity must be positive")
         
-        self.quantity += quantity
-        self.updated_at = datetime.utcnow()
+        prev = self.quantity
+        self.quantity = prev + quantity
         
         # Create audit log
         from .audit_log import AuditLog
@@ -144,13 +239,72 @@ class InventoryItem(db.Model):
             action='add_stock',
             table_name='inventory_items',
             record_id=self.id,
-            old_value=str(self.quantity - quantity),
+            old_value=str(prev),
             new_value=str(self.quantity),
             notes=notes or f"Added {quantity} units"
         )
         db.session.add(audit_log)
-        db.session.commit()
-    
+
+    @classmethod
+    def add_stock_bulk(cls, deltas):
+        """Add stock to many items in one UPDATE and one audit INSERT
+
+        deltas is a list of dicts with item_id, quantity, user_id and optional notes.
+        Returns a dict mapping item id to its new quantity.
+        """
+        if not deltas:
+            return {}
+
+        totals = {}
+        for delta in deltas:
+            if delta['quantity'] <= 0:
+                raise ValueError("Quantity must be positive")
+            totals[delta['item_id']] = totals.get(delta['item_id'], 0) + delta['quantity']
+
+        current = dict(
+            db.session.query(cls.id, cls.quantity)
+            .filter(cls.id.in_(totals.keys()))
+            .with_for_update()
+            .all()
+        )
+        missing = set(totals) - set(current)
+        if missing:
+            raise ValueError(f"Inventory items not found: {sorted(missing)}")
+
+        db.session.execute(
+            update(cls.__table__)
+            .where(cls.__table__.c.id == bindparam('b_id'))
+            .values(quantity=cls.__table__.c.quantity + bindparam('b_delta')),
+            [{'b_id': item_id, 'b_delta': quantity} for item_id, quantity in totals.items()]
+        )
+
+        # Audit rows carry the running quantity so repeated items log each step
+        from .audit_log import AuditLog
+        running = dict(current)
+        rows = []
+        for delta in deltas:
+            item_id = delta['item_id']
+            prev = running[item_id]
+            running[item_id] = prev + delta['quantity']
+            rows.append({
+                'user_id': delta['user_id'],
+                'action': 'add_stock',
+                'table_name': 'inventory_items',
+                'record_id': item_id,
+                'old_value': str(prev),
+                'new_value': str(running[item_id]),
+                'notes': delta.get('notes') or f"Added {delta['quantity']} units"
+            })
+        db.session.bulk_insert_mappings(AuditLog, rows)
+
+        # The Core UPDATE bypasses the identity map; refresh quantity on any
+        # already-loaded items without issuing another SELECT
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, cls) and obj.id in running:
+                set_committed_value(obj, 'quantity', running[obj.id])
+
+        return running
+
     def remove_stock(self, quantity, user_id, notes=None):
         """Remove stock from inventory"""
         if quantity <= 0:
@@ -158,8 +312,8 @@ class InventoryItem(db.Model):
         if self.quantity < quantity:
             raise ValueError("Insufficient stock")
         
-        self.quantity -= quantity
-        self.updated_at = datetime.utcnow()
+        prev = self.quantity
+        self.quantity = prev - quantity
         
         # Create audit log
         from .audit_log import AuditLog
@@ -168,12 +322,11 @@ class InventoryItem(db.Model):
             action='remove_stock',
             table_name='inventory_items',
             record_id=self.id,
-            old_value=str(self.quantity + quantity),
+            old_value=str(prev),
             new_value=str(self.quantity),
             notes=notes or f"Removed {quantity} units"
         )
         db.session.add(audit_log)
-        db.session.commit()
     
     def to_dict(self, include_qr=False):
         """Convert inventory item to dictionary"""
@@ -185,7 +338,7 @@ class InventoryItem(db.Model):
             'category': self.category.to_dict() if self.category else None,
             'location': self.location.to_dict() if self.location else None,
             'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
+            'unit_price': self.unit_price,
             'total_value': self.total_value,
             'reorder_level': self.reorder_level,
             'reorder_quantity': self.reorder_quantity,
@@ -196,8 +349,8 @@ class InventoryItem(db.Model):
             'needs_reorder': self.needs_reorder,
             'is_active': self.is_active,
             'created_by': self.created_by_user.to_dict_public() if self.created_by_user else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         if include_qr:
             data['qr_code'] = self.get_qr_code_base64()
@@ -205,23 +358,56 @@ class InventoryItem(db.Model):
     
     def to_dict_summary(self):
         """Convert to summary dictionary for lists"""
+        # Read each column once rather than through the three hybrids
+        quantity = self.quantity
+        unit_price = self.unit_price
+        reorder_level = self.reorder_level
+        category = self.category
+        location = self.location
         return {
             'id': self.id,
             'sku': self.sku,
             'name': self.name,
-            'category_name': self.category.name if self.category else None,
-            'location_name': self.location.name if self.location else None,
-            'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
-            'total_value': self.total_value,
-            'status': self.status,
-            'needs_reorder': self.needs_reorder
+            'category_name': category.name if category else None,
+            'location_name': location.name if location else None,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_value': float(quantity * unit_price),
+            'status': _stock_status(quantity, reorder_level),
+            'needs_reorder': quantity <= reorder_level
         }
     
+    @staticmethod
+    def update_by_id(item_id, values, *criteria):
+        """UPDATE one item in a single statement and return it as loaded from RETURNING
+        (None if no row with that id matches criteria)"""
+        return db.session.execute(
+            db.update(InventoryItem)
+            .where(InventoryItem.id == item_id, *criteria)
+            .values(**values)
+            .returning(InventoryItem)
+        ).scalar_one_or_none()
+    
+    @staticmethod
+    def insert_unless_sku_exists(values):
+        """INSERT ... ON CONFLICT (sku) DO NOTHING RETURNING id; returns the new id, or None if the SKU is taken"""
+        stmt = dialect_insert(InventoryItem.__table__).values(**values).on_conflict_do_nothing(
+            index_elements=['sku']
+        ).returning(InventoryItem.id)
+        return db.session.execute(stmt).scalar()
+    
+    @staticmethod
+    def list_query():
+        """Base query for lists rendered with to_dict_summary, with category and location eager-loaded"""
+        return InventoryItem.query.options(
+            selectinload(InventoryItem.category),
+            selectinload(InventoryItem.location)
+        )
+    
     @staticmethod
     def get_low_stock_items():
         """Get items with low stock"""
-        return InventoryItem.query.filter(
+        return InventoryItem.list_query().filter(
             InventoryItem.quantity <= InventoryItem.reorder_level,
             InventoryItem.is_active == True
         ).all()
@@ -229,46 +415,82 @@ class InventoryItem(db.Model):
     @staticmethod
     def get_out_of_stock_items():
         """Get items that are out of stock"""
-        return InventoryItem.query.filter(
+        return InventoryItem.list_query().filter(
             InventoryItem.quantity == 0,
             InventoryItem.is_active == True
         ).all()
     
     @staticmethod
-    def search_items(query, category_id=None, location_id=None):
-        """Search inventory items"""
-        search = InventoryItem.query.filter(InventoryItem.is_active == True)
-        
+    def search_filter(query):
+        """Substring match on name, sku or description, served by the ix_inv_search_trgm GIN index"""
+        return _search_text(
+            InventoryItem.name, InventoryItem.sku, InventoryItem.description
+        ).ilike(f'%{query}%')
+    
+    @staticmethod
+    def search_criteria(query, category_id=None, location_id=None):
+        """WHERE clauses for search_items and iter_summaries"""
+        criteria = []
         if query:
-            search = search.filter(
-                db.or_(
-                    InventoryItem.name.ilike(f'%{query}%'),
-                    InventoryItem.sku.ilike(f'%{query}%'),
-                    InventoryItem.description.ilike(f'%{query}%')
-                )
-            )
-        
+            criteria.append(InventoryItem.search_filter(query))
         if category_id:
-            search = search.filter(InventoryItem.category_id == category_id)
-        
+            criteria.append(InventoryItem.category_id == category_id)
         if location_id:
-            search = search.filter(InventoryItem.location_id == location_id)
-        
-        return search.order_by(InventoryItem.name).all()
+            criteria.append(InventoryItem.location_id == location_id)
+        return criteria
+    
+    @staticmethod
+    def search_items(query, category_id=None, location_id=None):
+        """Search inventory items"""
+        return InventoryItem.list_query().filter(
+            InventoryItem.is_active == True,
+            *InventoryItem.search_criteria(query, category_id, location_id)
+        ).order_by(InventoryItem.name).all()
+    
+    @staticmethod
+    def iter_summaries(*criteria, limit=None):
+        """Yield to_dict_summary()-shaped dicts for active items matching criteria, ordered by (name, id).
+        Reads columns in batches of 500 instead of loading every item and its relationships"""
+        rows = db.session.execute(
+            db.select(
+                InventoryItem.id,
+                InventoryItem.sku,
+                InventoryItem.name,
+                Category.name,
+                Location.name,
+                InventoryItem.quantity,
+                InventoryItem.unit_price,
+                InventoryItem.reorder_level
+            ).outerjoin(Category, InventoryItem.category_id == Category.id)
+            .outerjoin(Location, InventoryItem.location_id == Location.id)
+            .where(InventoryItem.is_active == True, *criteria)
+            .order_by(InventoryItem.name, InventoryItem.id)
+            .limit(limit)
+            .execution_options(yield_per=500)
+        )
+        for item_id, sku, name, category_name, location_name, quantity, unit_price, reorder_level in rows:
+            yield {
+                'id': item_id,
+                'sku': sku,
+                'name': name,
+                'category_name': category_name,
+                'location_name': location_name,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_value': float(quantity * unit_price),
+                'status': _stock_status(quantity, reorder_level),
+                'needs_reorder': quantity <= reorder_level
+            }
     
     @staticmethod
     def get_inventory_summary():
         """Get inventory summary statistics"""
-        total_items = InventoryItem.query.filter_by(is_active=True).count()
-        total_value = db.session.query(func.sum(InventoryItem.quantity * InventoryItem.unit_price)).filter_by(is_active=True).scalar() or 0
-        low_stock_count = InventoryItem.query.filter(
-            InventoryItem.quantity <= InventoryItem.reorder_level,
-            InventoryItem.is_active == True
-        ).count()
-        out_of_stock_count = InventoryItem.query.filter(
-            InventoryItem.quantity == 0,
-            InventoryItem.is_active == True
-        ).count()
+        total_items, total_value, low_stock_count, out_of_stock_count = db.session.query(
+            func.count(InventoryItem.id),
+            func.coalesce(func.sum(InventoryItem.quantity * InventoryItem.unit_price), 0),
+            func.coalesce(func.sum(case((InventoryItem.quantity <= InventoryItem.reorder_level, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((InventoryItem.quantity == 0, 1), else_=0)), 0)
+        ).filter(InventoryItem.is_active == True).one()
         
         return {
             'total_items': total_items,
@@ -278,16 +500,24 @@ class InventoryItem(db.Model):
         }
     
     def get_qr_code_base64(self):
-        qr = qrcode.QRCode(box_size=4, border=2)
-        qr.add_data(f'INVENTORY:{self.sku}')
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buf = io.BytesIO()
-        img.save(buf, format='PNG')
-        buf.seek(0)
-        img_bytes = buf.read()
-        base64_str = base64.b64encode(img_bytes).decode('utf-8')
-        return f'data:image/png;base64,{base64_str}'
+        """Get the item's QR code as a base64 PNG data URI"""
+        return _qr_for_sku(self.sku)
+    
+    @staticmethod
+    def get_qr_code_png(sku):
+        """Get the raw QR code PNG bytes for a SKU"""
+        return _qr_png_for_sku(sku)
+    
+    @staticmethod
+    def get_export_version():
+        """Get a (count, last item change, last location change) tuple that changes whenever an export would"""
+        return tuple(db.session.execute(
+            db.select(
+                func.count(InventoryItem.id),
+                func.max(InventoryItem.updated_at),
+                db.select(func.max(Location.updated_at)).scalar_subquery()
+            )
+        ).one())
     
     def __repr__(self):
-        return f'<InventoryItem {self.sku}: {self.name}>' 
\ No newline at end of file
+        return f'<InventoryItem {self.sku}: {self.name}>'
\ No newline at end of file
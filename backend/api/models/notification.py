@@ -1,7 +1,8 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import raiseload
+from sqlalchemy.sql import func
 
-db = SQLAlchemy()
+from ._db import db
 
 class Notification(db.Model):
     """Notification model for system alerts and user notifications"""
@@ -13,31 +14,29 @@ class Notification(db.Model):
     message = db.Column(db.Text, nullable=False)
     type = db.Column(db.String(20), default='info')  # info, success, warning, error
     is_read = db.Column(db.Boolean, default=False)
-    read_at = db.Column(db.DateTime)
+    read_at = db.Column(db.DateTime(timezone=True))
     action_url = db.Column(db.String(500))  # URL to navigate to when clicked
-    expires_at = db.Column(db.DateTime)  # Optional expiration date
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, index=True)  # Optional expiration date
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
     
-    # Relationships
-    user = db.relationship('User', backref='notifications')
+    __table_args__ = (
+        # Serves get_user_notifications, get_unread_count and mark_all_as_read
+        db.Index('ix_notif_user_read_created', user_id, is_read, created_at.desc()),
+    )
     
-    def __init__(self, **kwargs):
-        super(Notification, self).__init__(**kwargs)
-        if not self.created_at:
-            self.created_at = datetime.utcnow()
+    # Relationships
+    user = db.relationship('User', back_populates='notifications')
     
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
             self.is_read = True
-            self.read_at = datetime.utcnow()
-            db.session.commit()
+            self.read_at = func.now()
     
     def mark_as_unread(self):
         """Mark notification as unread"""
         self.is_read = False
         self.read_at = None
-        db.session.commit()
     
     @property
     def is_expired(self):
@@ -55,11 +54,11 @@ class Notification(db.Model):
             'message': self.message,
             'type': self.type,
             'is_read': self.is_read,
-            'read_at': self.read_at.isoformat() if self.read_at else None,
+            'read_at': self.read_at,
             'action_url': self.action_url,
-            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'expires_at': self.expires_at,
             'is_expired': self.is_expired,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
     
     @staticmethod
@@ -74,13 +73,12 @@ class Notification(db.Model):
             expires_at=expires_at
         )
         db.session.add(notification)
-        db.session.commit()
         return notification
     
     @staticmethod
     def get_user_notifications(user_id, limit=50, unread_only=False):
         """Get notifications for a specific user"""
-        query = Notification.query.filter_by(user_id=user_id)
+        query = Notification.query.options(raiseload('*')).filter_by(user_id=user_id)
         
         if unread_only:
             query = query.filter_by(is_read=False)
@@ -98,51 +96,39 @@ class Notification(db.Model):
     @staticmethod
     def mark_all_as_read(user_id):
         """Mark all notifications as read for a user"""
-        notifications = Notification.query.filter_by(
+        updated = Notification.query.filter_by(
             user_id=user_id,
             is_read=False
-        ).all()
-        
-        for notification in notifications:
-            notification.mark_as_read()
-        
-        return len(notifications)
+        ).update({'is_read': True, 'read_at': func.now()}, synchronize_session=False)
+        return updated
     
     @staticmethod
     def delete_expired_notifications():
         """Delete expired notifications"""
-        expired = Notification.query.filter(
+        count = Notification.query.filter(
             Notification.expires_at < datetime.utcnow()
-        ).all()
-        
-        count = len(expired)
-        for notification in expired:
-            db.session.delete(notification)
-        
-        db.session.commit()
+        ).delete(synchronize_session=False)
         return count
     
     @staticmethod
     def create_low_stock_notification(inventory_item):
-        """Create low stock notification"""
+        """Create low stock notification for every admin and manager
+        
+        Returns the number of notifications created.
+        """
         # Find users with inventory management permissions
         from .user import User
-        users = User.query.filter(
+        user_ids = [user_id for (user_id,) in User.query.filter(
             User.role.in_(['admin', 'manager'])
-        ).all()
-        
-        notifications = []
-        for user in users:
-            notification = Notification.create_notification(
-                user_id=user.id,
-                title="Low Stock Alert",
-                message=f"Item '{inventory_item.name}' (SKU: {inventory_item.sku}) is running low on stock. Current quantity: {inventory_item.quantity}",
-                type="warning",
-                action_url=f"/inventory/{inventory_item.id}"
-            )
-            notifications.append(notification)
+        ).with_entities(User.id).all()]
         
-        return notifications
+        return Notification.bulk_create_notifications(
+            user_ids,
+            title="Low Stock Alert",
+            message=f"Item '{inventory_item.name}' (SKU: {inventory_item.sku}) is running low on stock. Current quantity: {inventory_item.quantity}",
+            type="warning",
+            action_url=f"/inventory/{inventory_item.id}"
+        )
     
     @staticmethod
     def create_purchase_order_notification(purchase_order, action):
@@ -178,24 +164,34 @@ class Notification(db.Model):
     
     @staticmethod
     def create_system_notification(title, message, user_ids=None, type='info'):
-        """Create system-wide notification"""
+        """Create system-wide notification
+        
+        Returns the number of notifications created.
+        """
         if user_ids is None:
             # Send to all active users
             from .user import User
-            users = User.query.filter_by(is_active=True).all()
-            user_ids = [user.id for user in users]
+            user_ids = [user_id for (user_id,) in User.query.filter_by(
+                is_active=True
+            ).with_entities(User.id).all()]
         
-        notifications = []
-        for user_id in user_ids:
-            notification = Notification.create_notification(
-                user_id=user_id,
-                title=title,
-                message=message,
-                type=type
-            )
-            notifications.append(notification)
+        return Notification.bulk_create_notifications(user_ids, title, message, type=type)
+    
+    @staticmethod
+    def bulk_create_notifications(user_ids, title, message, type='info', action_url=None, expires_at=None):
+        """Create the same notification for many users in one INSERT"""
+        rows = [{
+            'user_id': user_id,
+            'title': title,
+            'message': message,
+            'type': type,
+            'action_url': action_url,
+            'expires_at': expires_at
+        } for user_id in user_ids]
         
-        return notifications
+        if rows:
+            db.session.bulk_insert_mappings(Notification, rows)
+        return len(rows)
     
     def __repr__(self):
         return f'<Notification {self.title} for user {self.user_id}>' 
\ No newline at end of file
@@ -1,9 +1,11 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, update
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import deferred, selectinload, undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import func
 
-db = SQLAlchemy()
+from ._db import db, dialect_insert
 
 class PurchaseOrder(db.Model):
     """Purchase Order model for managing procurement"""
@@ -16,22 +18,45 @@ class PurchaseOrder(db.Model):
     total_amount = db.Column(db.Numeric(12, 2), default=0, nullable=False)
     currency = db.Column(db.String(3), default='USD')
     delivery_date = db.Column(db.Date)
-    delivery_address = db.Column(db.Text)
-    notes = db.Column(db.Text)
+    # Free-text columns only the detail view shows; loaded on first access (as one group)
+    delivery_address = deferred(db.Column(db.Text), group='details')
+    notes = deferred(db.Column(db.Text), group='details')
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
-    approved_at = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    approved_at = db.Column(db.DateTime(timezone=True))
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # List views filter on status/supplier and order by newest first
+        db.Index('ix_po_status_created', status, created_at.desc()),
+        db.Index('ix_po_supplier_created', supplier_id, created_at.desc()),
+        # Trigram indexes (PostgreSQL pg_trgm) so search_orders' '%q%' ILIKE filters can use an index
+        db.Index('ix_po_number_trgm', po_number, postgresql_using='gin', postgresql_ops={'po_number': 'gin_trgm_ops'}),
+        db.Index('ix_po_notes_trgm', 'notes', postgresql_using='gin', postgresql_ops={'notes': 'gin_trgm_ops'}),
+    )
+    
+    # Fetch server-generated timestamps with RETURNING on INSERT instead of a later SELECT
+    __mapper_args__ = {'eager_defaults': True}
     
     # Relationships
-    supplier = db.relationship('Supplier', backref='purchase_orders')
-    created_by_user = db.relationship('User', foreign_keys=[created_by], backref='created_purchase_orders')
-    approved_by_user = db.relationship('User', foreign_keys=[approved_by], backref='approved_purchase_orders')
-    items = db.relationship('PurchaseOrderItem', backref='purchase_order', lazy='dynamic', cascade='all, delete-orphan')
-    audit_logs = db.relationship('AuditLog', backref='purchase_order', lazy='dynamic')
+    supplier = db.relationship('Supplier', back_populates='purchase_orders')
+    created_by_user = db.relationship('User', foreign_keys=[created_by], back_populates='created_purchase_orders')
+    approved_by_user = db.relationship('User', foreign_keys=[approved_by], back_populates='approved_purchase_orders')
+    items = db.relationship('PurchaseOrderItem', back_populates='purchase_order', cascade='all, delete-orphan')
+    # audit_logs has no FK to purchase_orders; read history through the indexed
+    # AuditLog.get_table_activity('purchase_orders', po.id) instead of loading this
+    audit_logs = db.relationship(
+        'AuditLog',
+        primaryjoin="and_(foreign(AuditLog.record_id) == PurchaseOrder.id, "
+                    "AuditLog.table_name == 'purchase_orders')",
+        viewonly=True,
+        lazy='raise'
+    )
     
     def __init__(self, **kwargs):
+        # po_number comes from DocumentCounter.next_value, which does not autoflush,
+        # so a PO cascaded into the session via supplier= is not inserted half-built
         super(PurchaseOrder, self).__init__(**kwargs)
         if not self.po_number:
             self.po_number = self.generate_po_number()
@@ -39,22 +64,25 @@ class PurchaseOrder(db.Model):
     @staticmethod
     def generate_po_number():
         """Generate unique PO number"""
-        from datetime import datetime
-        year = datetime.now().year
-        month = datetime.now().month
+        from .counter import DocumentCounter
+        now = datetime.now()
+        month_start = datetime(now.year, now.month, 1)
         
-        # Get count of POs for this year/month
-        count = PurchaseOrder.query.filter(
-            db.extract('year', PurchaseOrder.created_at) == year,
-            db.extract('month', PurchaseOrder.created_at) == month
-        ).count()
+        def existing_count():
+            # Only runs once per month, when that month's counter is first created
+            next_month = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+            return PurchaseOrder.query.filter(
+                PurchaseOrder.created_at >= month_start,
+                PurchaseOrder.created_at < next_month
+            ).count()
         
-        return f"PO-{year}{month:02d}-{count+1:03d}"
+        number = DocumentCounter.next_value('po_number', month_start.strftime('%Y%m'), seed=existing_count)
+        return f"PO-{now.year}{now.month:02d}-{number:03d}"
     
     @hybrid_property
     def item_count(self):
         """Get total number of items in PO"""
-        return self.items.count()
+        return len(self.items)
     
     @hybrid_property
     def can_approve(self):
@@ -73,41 +101,77 @@ class PurchaseOrder(db.Model):
     
     def calculate_total(self):
         """Calculate total amount from items"""
-        total = sum(item.total_price for item in self.items)
-        self.total_amount = total
+        if self.id is None:
+            # Pending PO: its items only exist in memory, without generated totals yet
+            total = sum(item.quantity * item.unit_price for item in self.items)
+            self.total_amount = total
+            return total
+        
+        # Summed in SQL (in Numeric) without loading the item rows. A Core UPDATE does not
+        # autoflush, so write pending line changes (e.g. remove_item's delete) first
+        db.session.flush()
+        table = PurchaseOrder.__table__
+        line_total = db.select(
+            func.coalesce(func.sum(PurchaseOrderItem.total_price), 0)
+        ).where(PurchaseOrderItem.purchase_order_id == self.id).scalar_subquery()
+        total = db.session.execute(
+            update(table).where(table.c.id == self.id)
+            .values(total_amount=line_total)
+            .returning(table.c.total_amount)
+        ).scalar()
+        set_committed_value(self, 'total_amount', total)
         return total
     
     def add_item(self, inventory_item_id, quantity, unit_price, notes=None):
-        """Add item to purchase order"""
-        from .inventory import InventoryItem
-        
-        # Check if item already exists
-        existing_item = self.items.filter_by(inventory_item_id=inventory_item_id).first()
-        if existing_item:
-            existing_item.quantity += quantity
-            existing_item.unit_price = unit_price
-            if notes:
-                existing_item.notes = notes
+        """Add item to purchase order, merging into an existing line for the same inventory item"""
+        if self.id is None:
+            # Not flushed yet, so there are no rows to upsert against; merge in memory
+            existing_item = next(
+                (item for item in self.items if item.inventory_item_id == inventory_item_id), None
+            )
+            if existing_item:
+                existing_item.quantity += quantity
+                existing_item.unit_price = unit_price
+                if notes:
+                    existing_item.notes = notes
+            else:
+                self.items.append(PurchaseOrderItem(
+                    inventory_item_id=inventory_item_id,
+                    quantity=quantity,
+                    unit_price=unit_price,
+                    notes=notes
+                ))
         else:
-            item = PurchaseOrderItem(
+            # One INSERT ... ON CONFLICT against uq_po_item instead of SELECT then INSERT/UPDATE
+            table = PurchaseOrderItem.__table__
+            stmt = dialect_insert(table).values(
                 purchase_order_id=self.id,
                 inventory_item_id=inventory_item_id,
                 quantity=quantity,
                 unit_price=unit_price,
                 notes=notes
             )
-            db.session.add(item)
+            merged = {
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'unit_price': stmt.excluded.unit_price
+            }
+            if notes:
+                merged['notes'] = stmt.excluded.notes
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['purchase_order_id', 'inventory_item_id'],
+                set_=merged
+            ))
+            db.session.expire(self, ['items'])
         
         self.calculate_total()
-        db.session.commit()
     
     def remove_item(self, item_id):
         """Remove item from purchase order"""
-        item = self.items.filter_by(id=item_id).first()
+        item = next((item for item in self.items if item.id == item_id), None)
         if item:
-            db.session.delete(item)
+            # delete-orphan cascade deletes the row once it leaves the collection
+            self.items.remove(item)
             self.calculate_total()
-            db.session.commit()
     
     def approve(self, approved_by_user_id, notes=None):
         """Approve purchase order"""
@@ -116,8 +180,7 @@ class PurchaseOrder(db.Model):
         
         self.status = 'approved'
         self.approved_by = approved_by_user_id
-        self.approved_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        self.approved_at = func.now()
         
         # Create audit log
         from .audit_log import AuditLog
@@ -130,8 +193,6 @@ class PurchaseOrder(db.Model):
             new_value='approved',
             notes=notes or f"Purchase order {self.po_number} approved"
         )
-        db.session.add(audit_log)
-        db.session.commit()
         
         # Create notification for supplier
         from .notification import Notification
@@ -141,8 +202,7 @@ class PurchaseOrder(db.Model):
             message=f"Purchase order {self.po_number} has been approved",
             type="info"
         )
-        db.session.add(notification)
-        db.session.commit()
+        db.session.add_all([audit_log, notification])
     
     def reject(self, rejected_by_user_id, notes=None):
         """Reject purchase order"""
@@ -150,7 +210,6 @@ class PurchaseOrder(db.Model):
             raise ValueError("Purchase order cannot be rejected")
         
         self.status = 'rejected'
-        self.updated_at = datetime.utcnow()
         
         # Create audit log
         from .audit_log import AuditLog
@@ -163,8 +222,6 @@ class PurchaseOrder(db.Model):
             new_value='rejected',
             notes=notes or f"Purchase order {self.po_number} rejected"
         )
-        db.session.add(audit_log)
-        db.session.commit()
         
         # Create notification
         from .notification import Notification
@@ -174,8 +231,7 @@ class PurchaseOrder(db.Model):
             message=f"Purchase order {self.po_number} has been rejected",
             type="warning"
         )
-        db.session.add(notification)
-        db.session.commit()
+        db.session.add_all([audit_log, notification])
     
     def mark_delivered(self, delivered_by_user_id, notes=None):
         """Mark purchase order as delivered"""
@@ -183,17 +239,15 @@ class PurchaseOrder(db.Model):
             raise ValueError("Only approved purchase orders can be marked as delivered")
         
         self.status = 'delivered'
-        self.updated_at = datetime.utcnow()
         
-        # Add items to inventory
-        for item in self.items:
-            inventory_item = item.inventory_item
-            if inventory_item:
-                inventory_item.add_stock(
-                    quantity=item.quantity,
-                    user_id=delivered_by_user_id,
-                    notes=f"Delivery from PO {self.po_number}"
-                )
+        # Add items to inventory: one UPDATE and one audit INSERT for all lines
+        from .inventory import InventoryItem
+        InventoryItem.add_stock_bulk([{
+            'item_id': item.inventory_item_id,
+            'quantity': item.quantity,
+            'user_id': delivered_by_user_id,
+            'notes': f"Delivery from PO {self.po_number}"
+        } for item in self.items])
         
         # Create audit log
         from .audit_log import AuditLog
@@ -207,7 +261,6 @@ class PurchaseOrder(db.Model):
             notes=notes or f"Purchase order {self.po_number} delivered"
         )
         db.session.add(audit_log)
-        db.session.commit()
     
     def to_dict(self):
         """Convert purchase order to dictionary"""
@@ -216,9 +269,9 @@ class PurchaseOrder(db.Model):
             'po_number': self.po_number,
             'supplier': self.supplier.to_dict() if self.supplier else None,
             'status': self.status,
-            'total_amount': float(self.total_amount),
+            'total_amount': self.total_amount,
             'currency': self.currency,
-            'delivery_date': self.delivery_date.isoformat() if self.delivery_date else None,
+            'delivery_date': self.delivery_date,
             'delivery_address': self.delivery_address,
             'notes': self.notes,
             'item_count': self.item_count,
@@ -227,46 +280,83 @@ class PurchaseOrder(db.Model):
             'can_cancel': self.can_cancel,
             'created_by': self.created_by_user.to_dict_public() if self.created_by_user else None,
             'approved_by': self.approved_by_user.to_dict_public() if self.approved_by_user else None,
-            'approved_at': self.approved_at.isoformat() if self.approved_at else None,
+            'approved_at': self.approved_at,
             'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
-    def to_dict_summary(self):
-        """Convert to summary dictionary for lists"""
+    def to_dict_summary(self, item_count=None):
+        """Convert to summary dictionary for lists
+        
+        Pass item_count from get_item_counts to avoid loading each order's items.
+        """
         return {
             'id': self.id,
             'po_number': self.po_number,
             'supplier_name': self.supplier.company_name if self.supplier else None,
             'status': self.status,
-            'total_amount': float(self.total_amount),
+            'total_amount': self.total_amount,
             'currency': self.currency,
-            'item_count': self.item_count,
-            'delivery_date': self.delivery_date.isoformat() if self.delivery_date else None,
+            'item_count': self.item_count if item_count is None else item_count,
+            'delivery_date': self.delivery_date,
             'created_by': self.created_by_user.full_name if self.created_by_user else None,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
     
+    @staticmethod
+    def _list_query():
+        """Base query for list helpers with everything to_dict/to_dict_summary touch eager-loaded"""
+        from .inventory import InventoryItem
+        inventory_item = selectinload(PurchaseOrder.items).selectinload(PurchaseOrderItem.inventory_item)
+        return PurchaseOrder.query.options(
+            selectinload(PurchaseOrder.supplier),
+            selectinload(PurchaseOrder.created_by_user),
+            selectinload(PurchaseOrder.approved_by_user),
+            inventory_item.selectinload(InventoryItem.category),
+            inventory_item.selectinload(InventoryItem.location)
+        )
+    
+    @staticmethod
+    def get_detail(po_id):
+        """Get one purchase order with the deferred text columns (its own and its supplier's) loaded for to_dict"""
+        return PurchaseOrder._list_query().options(
+            undefer_group('details'),
+            selectinload(PurchaseOrder.supplier).undefer_group('details')
+        ).filter_by(id=po_id).first()
+    
+    @staticmethod
+    def get_item_counts(po_ids):
+        """Get line counts for many purchase orders in one grouped query, as {po_id: count}"""
+        if not po_ids:
+            return {}
+        counts = dict(db.session.query(
+            PurchaseOrderItem.purchase_order_id,
+            func.count(PurchaseOrderItem.id)
+        ).filter(PurchaseOrderItem.purchase_order_id.in_(po_ids)).group_by(
+            PurchaseOrderItem.purchase_order_id
+        ).all())
+        return {po_id: counts.get(po_id, 0) for po_id in po_ids}
+    
     @staticmethod
     def get_pending_orders():
         """Get all pending purchase orders"""
-        return PurchaseOrder.query.filter_by(status='pending').order_by(PurchaseOrder.created_at.desc()).all()
+        return PurchaseOrder._list_query().filter_by(status='pending').order_by(PurchaseOrder.created_at.desc()).all()
     
     @staticmethod
     def get_orders_by_status(status):
         """Get purchase orders by status"""
-        return PurchaseOrder.query.filter_by(status=status).order_by(PurchaseOrder.created_at.desc()).all()
+        return PurchaseOrder._list_query().filter_by(status=status).order_by(PurchaseOrder.created_at.desc()).all()
     
     @staticmethod
     def get_orders_by_supplier(supplier_id):
         """Get purchase orders by supplier"""
-        return PurchaseOrder.query.filter_by(supplier_id=supplier_id).order_by(PurchaseOrder.created_at.desc()).all()
+        return PurchaseOrder._list_query().filter_by(supplier_id=supplier_id).order_by(PurchaseOrder.created_at.desc()).all()
     
     @staticmethod
     def search_orders(query, status=None, supplier_id=None):
         """Search purchase orders"""
-        search = PurchaseOrder.query
+        search = PurchaseOrder._list_query()
         
         if query:
             search = search.filter(
@@ -287,11 +377,16 @@ class PurchaseOrder(db.Model):
     @staticmethod
     def get_po_summary():
         """Get purchase order summary statistics"""
-        total_orders = PurchaseOrder.query.count()
-        pending_orders = PurchaseOrder.query.filter_by(status='pending').count()
-        approved_orders = PurchaseOrder.query.filter_by(status='approved').count()
-        delivered_orders = PurchaseOrder.query.filter_by(status='delivered').count()
-        total_value = db.session.query(func.sum(PurchaseOrder.total_amount)).scalar() or 0
+        def count_status(status):
+            return func.coalesce(func.sum(case((PurchaseOrder.status == status, 1), else_=0)), 0)
+        
+        total_orders, pending_orders, approved_orders, delivered_orders, total_value = db.session.query(
+            func.count(PurchaseOrder.id),
+            count_status('pending'),
+            count_status('approved'),
+            count_status('delivered'),
+            func.coalesce(func.sum(PurchaseOrder.total_amount), 0)
+        ).one()
         
         return {
             'total_orders': total_orders,
@@ -313,17 +408,21 @@ class PurchaseOrderItem(db.Model):
     inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_items.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    total_price = db.Column(db.Numeric(12, 2), db.Computed('quantity * unit_price', persisted=True))
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # One line per inventory item per PO; add_item upserts against it
+        db.UniqueConstraint('purchase_order_id', 'inventory_item_id', name='uq_po_item'),
+    )
+    
+    __mapper_args__ = {'eager_defaults': True}
     
     # Relationships
+    purchase_order = db.relationship('PurchaseOrder', back_populates='items')
     inventory_item = db.relationship('InventoryItem', backref='purchase_order_items')
     
-    @hybrid_property
-    def total_price(self):
-        """Calculate total price for this item"""
-        return float(self.quantity * self.unit_price)
-    
     def to_dict(self):
         """Convert purchase order item to dictionary"""
         return {
@@ -331,10 +430,10 @@ class PurchaseOrderItem(db.Model):
             'purchase_order_id': self.purchase_order_id,
             'inventory_item': self.inventory_item.to_dict_summary() if self.inventory_item else None,
             'quantity': self.quantity,
-            'unit_price': float(self.unit_price),
+            'unit_price': self.unit_price,
             'total_price': self.total_price,
             'notes': self.notes,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
     
     def __repr__(self):
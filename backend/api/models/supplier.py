@@ -1,9 +1,12 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+import functools
+from sqlalchemy import case
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import deferred, undefer_group
 from sqlalchemy.sql import func
 
-db = SQLAlchemy()
+from ._db import db
+from .purchase_order import PurchaseOrder
 
 class Supplier(db.Model):
     """Supplier model for managing vendor relationships"""
@@ -15,7 +18,8 @@ class Supplier(db.Model):
     contact_person = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
-    address = db.Column(db.Text)
+    # Free-text columns only the detail view shows; loaded on first access (as one group)
+    address = deferred(db.Column(db.Text), group='details')
     city = db.Column(db.String(100))
     state = db.Column(db.String(100))
     country = db.Column(db.String(100), default='Nigeria')
@@ -24,19 +28,39 @@ class Supplier(db.Model):
     category = db.Column(db.String(100))  # Raw Materials, Equipment, Services, etc.
     payment_terms = db.Column(db.String(100))
     tax_id = db.Column(db.String(50))
-    bank_details = db.Column(db.Text)
-    notes = db.Column(db.Text)
+    bank_details = deferred(db.Column(db.Text), group='details')
+    notes = deferred(db.Column(db.Text), group='details')
     is_active = db.Column(db.Boolean, default=True)
     rating = db.Column(db.Integer, default=5)  # 1-5 rating
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_suppliers_active_company', is_active, company_name),
+        # Trigram indexes (PostgreSQL pg_trgm) so search_suppliers' '%q%' ILIKE filters can use an index
+        db.Index('ix_suppliers_company_trgm', company_name, postgresql_using='gin', postgresql_ops={'company_name': 'gin_trgm_ops'}),
+        db.Index('ix_suppliers_contact_trgm', contact_person, postgresql_using='gin', postgresql_ops={'contact_person': 'gin_trgm_ops'}),
+        db.Index('ix_suppliers_email_trgm', email, postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'}),
+        db.Index('ix_suppliers_code_trgm', supplier_code, postgresql_using='gin', postgresql_ops={'supplier_code': 'gin_trgm_ops'}),
+    )
+    
+    __mapper_args__ = {'eager_defaults': True}
     
     # Relationships
     created_by_user = db.relationship('User', backref='created_suppliers')
-    purchase_orders = db.relationship('PurchaseOrder', backref='supplier', lazy='dynamic')
-    inventory_items = db.relationship('InventoryItem', backref='supplier', lazy='dynamic')
-    audit_logs = db.relationship('AuditLog', backref='supplier', lazy='dynamic')
+    # Kept dynamic: read through COUNT/LIMIT queries, never materialized whole
+    purchase_orders = db.relationship('PurchaseOrder', back_populates='supplier', lazy='dynamic')
+    inventory_items = db.relationship('InventoryItem', back_populates='supplier')
+    # audit_logs has no FK to suppliers; read history through the indexed
+    # AuditLog.get_table_activity('suppliers', supplier.id) instead of loading this
+    audit_logs = db.relationship(
+        'AuditLog',
+        primaryjoin="and_(foreign(AuditLog.record_id) == Supplier.id, "
+                    "AuditLog.table_name == 'suppliers')",
+        viewonly=True,
+        lazy='raise'
+    )
     
     def __init__(self, **kwargs):
         super(Supplier, self).__init__(**kwargs)
@@ -46,31 +70,23 @@ class Supplier(db.Model):
     @staticmethod
     def generate_supplier_code():
         """Generate unique supplier code"""
-        from datetime import datetime
+        from .counter import DocumentCounter
         year = datetime.now().year
         
-        # Get count of suppliers for this year
-        count = Supplier.query.filter(
-            db.extract('year', Supplier.created_at) == year
-        ).count()
+        def existing_count():
+            # Only runs once per year, when that year's counter is first created
+            return Supplier.query.filter(
+                Supplier.created_at >= datetime(year, 1, 1),
+                Supplier.created_at < datetime(year + 1, 1, 1)
+            ).count()
         
-        return f"SUP{year}{count+1:03d}"
+        number = DocumentCounter.next_value('supplier_code', str(year), seed=existing_count)
+        return f"SUP{year}{number:03d}"
     
-    @hybrid_property
+    @functools.cached_property
     def full_address(self):
-        """Get complete address"""
-        address_parts = []
-        if self.address:
-            address_parts.append(self.address)
-        if self.city:
-            address_parts.append(self.city)
-        if self.state:
-            address_parts.append(self.state)
-        if self.postal_code:
-            address_parts.append(self.postal_code)
-        if self.country:
-            address_parts.append(self.country)
-        
+        """Get complete address (built once per loaded instance)"""
+        address_parts = [part for part in (self.address, self.city, self.state, self.postal_code, self.country) if part]
         return ', '.join(address_parts) if address_parts else None
     
     @hybrid_property
@@ -78,6 +94,12 @@ class Supplier(db.Model):
         """Get total number of purchase orders"""
         return self.purchase_orders.count()
     
+    @order_count.expression
+    def order_count(cls):
+        return db.select(func.count(PurchaseOrder.id)).where(
+            PurchaseOrder.supplier_id == cls.id
+        ).correlate_except(PurchaseOrder).scalar_subquery()
+    
     @hybrid_property
     def total_spent(self):
         """Calculate total amount spent with this supplier"""
@@ -87,24 +109,38 @@ class Supplier(db.Model):
         ).scalar()
         return float(total) if total else 0.0
     
-    @hybrid_property
+    @total_spent.expression
+    def total_spent(cls):
+        return db.select(func.coalesce(func.sum(PurchaseOrder.total_amount), 0)).where(
+            PurchaseOrder.supplier_id == cls.id,
+            PurchaseOrder.status.in_(['approved', 'delivered'])
+        ).correlate_except(PurchaseOrder).scalar_subquery()
+    
+    @property
     def average_order_value(self):
         """Calculate average order value"""
-        if self.order_count == 0:
-            return 0.0
-        return self.total_spent / self.order_count
+        return self._average_order_value(self.order_count, self.total_spent)
     
-    @hybrid_property
+    @property
     def performance_rating(self):
         """Calculate performance rating based on various factors"""
+        return self._performance_rating(self.order_count, self.total_spent)
+    
+    @staticmethod
+    def _average_order_value(order_count, total_spent):
+        if order_count == 0:
+            return 0.0
+        return total_spent / order_count
+    
+    def _performance_rating(self, order_count, total_spent):
         # This is a simplified rating calculation
         # In a real system, this would be more complex
         base_rating = self.rating or 5
         
         # Adjust based on order count and total spent
-        if self.order_count > 10:
+        if order_count > 10:
             base_rating += 0.5
-        if self.total_spent > 10000:
+        if total_spent > 10000:
             base_rating += 0.5
         
         return min(5.0, max(1.0, base_rating))
@@ -113,8 +149,6 @@ class Supplier(db.Model):
         """Update supplier rating"""
         if 1 <= new_rating <= 5:
             self.rating = new_rating
-            self.updated_at = datetime.utcnow()
-            db.session.commit()
         else:
             raise ValueError("Rating must be between 1 and 5")
     
@@ -124,14 +158,16 @@ class Supplier(db.Model):
     
     def get_order_summary(self):
         """Get order summary by status"""
-        summary = {}
-        for status in ['pending', 'approved', 'delivered', 'rejected']:
-            count = self.purchase_orders.filter_by(status=status).count()
-            summary[status] = count
-        return summary
+        counts = dict(db.session.query(
+            PurchaseOrder.status,
+            func.count(PurchaseOrder.id)
+        ).filter(PurchaseOrder.supplier_id == self.id).group_by(PurchaseOrder.status).all())
+        return {status: counts.get(status, 0) for status in ['pending', 'approved', 'delivered', 'rejected']}
     
     def to_dict(self):
         """Convert supplier to dictionary"""
+        order_count = self.order_count
+        total_spent = self.total_spent
         return {
             'id': self.id,
             'supplier_code': self.supplier_code,
@@ -153,17 +189,24 @@ class Supplier(db.Model):
             'notes': self.notes,
             'is_active': self.is_active,
             'rating': self.rating,
-            'performance_rating': self.performance_rating,
-            'order_count': self.order_count,
-            'total_spent': self.total_spent,
-            'average_order_value': self.average_order_value,
+            'performance_rating': self._performance_rating(order_count, total_spent),
+            'order_count': order_count,
+            'total_spent': total_spent,
+            'average_order_value': self._average_order_value(order_count, total_spent),
             'created_by': self.created_by_user.to_dict_public() if self.created_by_user else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
-    def to_dict_summary(self):
-        """Convert to summary dictionary for lists"""
+    def to_dict_summary(self, order_count=None, total_spent=None):
+        """Convert to summary dictionary for lists
+        
+        Pass order_count/total_spent from get_order_stats to avoid per-supplier queries.
+        """
+        if order_count is None:
+            order_count = self.order_count
+        if total_spent is None:
+            total_spent = self.total_spent
         return {
             'id': self.id,
             'supplier_code': self.supplier_code,
@@ -174,11 +217,33 @@ class Supplier(db.Model):
             'category': self.category,
             'is_active': self.is_active,
             'rating': self.rating,
-            'performance_rating': self.performance_rating,
-            'order_count': self.order_count,
-            'total_spent': self.total_spent
+            'performance_rating': self._performance_rating(order_count, total_spent),
+            'order_count': order_count,
+            'total_spent': total_spent
         }
     
+    @staticmethod
+    def get_order_stats(supplier_ids):
+        """Get order counts and spend for many suppliers in one grouped query
+        
+        Returns {supplier_id: (order_count, total_spent)}.
+        """
+        if not supplier_ids:
+            return {}
+        spent = case((PurchaseOrder.status.in_(['approved', 'delivered']), PurchaseOrder.total_amount), else_=0)
+        rows = db.session.query(
+            PurchaseOrder.supplier_id,
+            func.count(PurchaseOrder.id),
+            func.coalesce(func.sum(spent), 0)
+        ).filter(PurchaseOrder.supplier_id.in_(supplier_ids)).group_by(PurchaseOrder.supplier_id).all()
+        stats = {supplier_id: (count, float(total)) for supplier_id, count, total in rows}
+        return {supplier_id: stats.get(supplier_id, (0, 0.0)) for supplier_id in supplier_ids}
+    
+    @staticmethod
+    def get_detail(supplier_id):
+        """Get one supplier with the deferred text columns loaded for to_dict"""
+        return Supplier.query.options(undefer_group('details')).filter_by(id=supplier_id).first()
+    
     @staticmethod
     def get_active_suppliers():
         """Get all active suppliers"""
@@ -212,6 +277,7 @@ class Supplier(db.Model):
     @staticmethod
     def get_top_suppliers(limit=10):
         """Get top suppliers by total spent"""
+        # total_spent resolves to a correlated SUM subquery here, so the sort runs in SQL
         return Supplier.query.filter_by(is_active=True).order_by(
             db.desc(Supplier.total_spent)
         ).limit(limit).all()
@@ -219,19 +285,23 @@ class Supplier(db.Model):
     @staticmethod
     def get_supplier_summary():
         """Get supplier summary statistics"""
-        total_suppliers = Supplier.query.count()
-        active_suppliers = Supplier.query.filter_by(is_active=True).count()
-        total_spent = db.session.query(func.sum(PurchaseOrder.total_amount)).filter(
-            PurchaseOrder.status.in_(['approved', 'delivered'])
-        ).scalar() or 0
+        total_spent = db.session.query(
+            func.coalesce(func.sum(PurchaseOrder.total_amount), 0)
+        ).filter(PurchaseOrder.status.in_(['approved', 'delivered'])).scalar_subquery()
         
-        # Get category distribution
-        categories = db.session.query(
+        # One grouped scan of suppliers yields the totals, the per-category
+        # distribution and (as a constant column) the spend across all orders
+        rows = db.session.query(
             Supplier.category,
-            func.count(Supplier.id)
-        ).filter_by(is_active=True).group_by(Supplier.category).all()
+            func.count(Supplier.id),
+            func.coalesce(func.sum(case((Supplier.is_active == True, 1), else_=0)), 0),
+            total_spent
+        ).group_by(Supplier.category).all()
         
-        category_distribution = {cat: count for cat, count in categories}
+        total_suppliers = sum(row[1] for row in rows)
+        active_suppliers = sum(row[2] for row in rows)
+        category_distribution = {category: active for category, _, active, _ in rows if active}
+        total_spent = rows[0][3] if rows else 0
         
         return {
             'total_suppliers': total_suppliers,
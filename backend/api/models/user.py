@@ -1,11 +1,46 @@
-from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+import functools
+import secrets
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+from sqlalchemy.orm import raiseload
+from sqlalchemy.sql import func
 
-db = SQLAlchemy()
+from ._db import db
+
+# argon2id via the argon2-cffi C extension, which releases the GIL while hashing.
+# Parameters are encoded in each hash, so changing them upgrades stored hashes
+# on the next successful login
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
+def configure_password_hashing(time_cost, memory_cost, parallelism):
+    """Set the argon2 cost parameters (called from create_app with the PASSWORD_HASH_* settings)"""
+    global _password_hasher
+    _password_hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    _dummy_password_hash.cache_clear()
+
+@functools.lru_cache(maxsize=1)
+def _dummy_password_hash():
+    return _password_hasher.hash(secrets.token_urlsafe(16))
+
+# Built once at import; has_permission runs on every guarded request
+_ROLE_PERMISSIONS = {
+    'admin': frozenset([
+        'user_management', 'inventory_management', 'purchase_order_management',
+        'supplier_management', 'reports', 'system_settings', 'audit_logs'
+    ]),
+    'manager': frozenset([
+        'inventory_management', 'purchase_order_management', 'supplier_management',
+        'reports', 'approve_orders'
+    ]),
+    'staff': frozenset([
+        'view_inventory', 'create_purchase_orders', 'view_suppliers',
+        'basic_reports'
+    ])
+}
+
+ROLES = frozenset(_ROLE_PERMISSIONS)
 
 class User(UserMixin, db.Model):
     """User model for authentication and role-based access control"""
@@ -17,66 +52,81 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
+    # Generated by the database, so list views and audit renders read it like any other column
+    full_name = db.Column(db.String(101), db.Computed("first_name || ' ' || last_name", persisted=True))
     role = db.Column(db.String(20), nullable=False, default='staff')  # admin, manager, staff
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
-    last_login = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_login = db.Column(db.DateTime(timezone=True))
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Serves the paginated active-user list (WHERE is_active ORDER BY id LIMIT ...)
+        db.Index('ix_users_active_id', is_active, id),
+        # Case-insensitive email lookups (login, signup checks); also stops
+        # two accounts differing only in email case
+        db.Index('ix_users_email_lower', func.lower(email), unique=True),
+    )
+    
+    __mapper_args__ = {'eager_defaults': True}
     
     # Relationships
-    audit_logs = db.relationship('AuditLog', backref='user', lazy='dynamic')
-    notifications = db.relationship('Notification', backref='user', lazy='dynamic')
-    created_purchase_orders = db.relationship('PurchaseOrder', backref='created_by_user', 
+    # Unbounded per-user histories stay dynamic so they are only ever read as filtered queries
+    audit_logs = db.relationship('AuditLog', back_populates='user', lazy='dynamic')
+    notifications = db.relationship('Notification', back_populates='user', lazy='dynamic')
+    created_purchase_orders = db.relationship('PurchaseOrder', back_populates='created_by_user', 
                                             foreign_keys='PurchaseOrder.created_by', lazy='dynamic')
-    approved_purchase_orders = db.relationship('PurchaseOrder', backref='approved_by_user',
+    approved_purchase_orders = db.relationship('PurchaseOrder', back_populates='approved_by_user',
                                              foreign_keys='PurchaseOrder.approved_by', lazy='dynamic')
     
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
-        if self.role not in ['admin', 'manager', 'staff']:
+        if self.role not in ROLES:
             self.role = 'staff'
     
-    @hybrid_property
-    def full_name(self):
-        """Get user's full name"""
-        return f"{self.first_name} {self.last_name}"
-    
-    @hybrid_property
+    @property
     def permissions(self):
         """Get user permissions based on role"""
-        permissions = {
-            'admin': [
-                'user_management', 'inventory_management', 'purchase_order_management',
-                'supplier_management', 'reports', 'system_settings', 'audit_logs'
-            ],
-            'manager': [
-                'inventory_management', 'purchase_order_management', 'supplier_management',
-                'reports', 'approve_orders'
-            ],
-            'staff': [
-                'view_inventory', 'create_purchase_orders', 'view_suppliers',
-                'basic_reports'
-            ]
-        }
-        return permissions.get(self.role, [])
+        return _ROLE_PERMISSIONS.get(self.role, frozenset())
     
     def has_permission(self, permission):
         """Check if user has specific permission"""
-        return permission in self.permissions
+        return permission in _ROLE_PERMISSIONS.get(self.role, ())
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _password_hasher.hash(password)
     
     def check_password(self, password):
-        """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check password against hash, upgrading legacy or outdated hashes on success"""
+        if not self.password_hash.startswith('$argon2'):
+            # Hash written by werkzeug before the switch to argon2
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        
+        try:
+            _password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if _password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+    
+    @staticmethod
+    def check_dummy_password(password):
+        """Spend the same hashing work as check_password when there is no user to check against"""
+        try:
+            _password_hasher.verify(_dummy_password_hash(), password)
+        except (VerificationError, InvalidHashError):
+            pass
+        return False
     
     def update_last_login(self):
         """Update last login timestamp"""
-        self.last_login = datetime.utcnow()
-        db.session.commit()
+        self.last_login = func.now()
     
     def to_dict(self):
         """Convert user to dictionary"""
@@ -88,12 +138,12 @@ class User(UserMixin, db.Model):
             'last_name': self.last_name,
             'full_name': self.full_name,
             'role': self.role,
-            'permissions': self.permissions,
+            'permissions': sorted(self.permissions),
             'is_active': self.is_active,
             'is_verified': self.is_verified,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'last_login': self.last_login,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def to_dict_public(self):
@@ -108,20 +158,64 @@ class User(UserMixin, db.Model):
             'is_active': self.is_active
         }
     
+    @staticmethod
+    def get_by_id(user_id):
+        """Get user by id, reusing the instance already loaded this request (e.g. by role_required)"""
+        return db.session.get(User, user_id)
+    
     @staticmethod
     def get_by_email(email):
-        """Get user by email"""
-        return User.query.filter_by(email=email).first()
+        """Get user by email (case-insensitive)"""
+        return User.query.filter(func.lower(User.email) == email.lower()).first()
     
     @staticmethod
     def get_by_username(username):
         """Get user by username"""
         return User.query.filter_by(username=username).first()
     
+    @staticmethod
+    def find_taken(username, email):
+        """Return 'username' or 'email' if either is already in use, else None (one query)"""
+        rows = db.session.execute(
+            db.select(User.username, User.email)
+            .where(db.or_(User.username == username, func.lower(User.email) == email.lower()))
+            .limit(2)
+        ).all()
+        if any(row.username == username for row in rows):
+            return 'username'
+        if rows:
+            return 'email'
+        return None
+    
+    @staticmethod
+    def deactivate(user_id):
+        """Soft-delete a user with a single UPDATE; return the username, or None if no such user"""
+        return db.session.execute(
+            db.update(User).where(User.id == user_id).values(is_active=False).returning(User.username)
+        ).scalar()
+    
     @staticmethod
     def get_active_users():
         """Get all active users"""
-        return User.query.filter_by(is_active=True).all()
+        # to_dict reads only columns; raiseload keeps a future relationship access from going N+1
+        return User.query.options(raiseload('*')).filter_by(is_active=True).all()
+    
+    @staticmethod
+    def get_active_users_page(page=1, per_page=50):
+        """Get one page of active users as to_dict() rows, ordered by id"""
+        # Column query: rows come back as plain tuples, no ORM instances to build
+        pagination = db.session.query(
+            User.id, User.username, User.email, User.first_name, User.last_name,
+            User.full_name, User.role, User.is_active, User.is_verified,
+            User.last_login, User.created_at, User.updated_at
+        ).filter(User.is_active.is_(True)).order_by(User.id).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        pagination.items = [
+            dict(row._mapping, permissions=sorted(_ROLE_PERMISSIONS.get(row.role, ())))
+            for row in pagination.items
+        ]
+        return pagination
     
     @staticmethod
     def get_users_by_role(role):
@@ -129,10 +223,4 @@ class User(UserMixin, db.Model):
         return User.query.filter_by(role=role, is_active=True).all()
     
     def __repr__(self):
-        return f'<User {self.username}>' 
-
-# Import AuditLog at the end to avoid circular import
-from .audit_log import AuditLog
-
-# Now, if you want to add the relationship, do it after both classes are defined:
-User.audit_logs = relationship("AuditLog", back_populates="user") 
\ No newline at end of file
+        return f'<User {self.username}>'  
\ No newline at end of file
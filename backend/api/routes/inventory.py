@@ -1,54 +1,227 @@
-from flask import Blueprint, request, jsonify, send_file, make_response, current_app
-from api.models.inventory import InventoryItem
-from io import BytesIO
+from flask import Blueprint, request, jsonify, send_file, make_response, current_app, Response, stream_with_context, url_for, abort
+from api.models import db
+from api.models.inventory import InventoryItem, Location
+from utils.helpers import keyset_paginate, get_keyset_pagination_info
+from io import BytesIO, StringIO
 import csv
+import hashlib
+import orjson
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 import base64
 
 inventory_bp = Blueprint('inventory', __name__)
 
+def _etag(*parts):
+    """Build an ETag from the values a response is a pure function of"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def _not_modified(etag):
+    """Return a 304 response if the client already holds this ETag, else None"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
 @inventory_bp.route('/', methods=['GET'])
 def get_all_inventory():
-    """Return all inventory items with QR codes for frontend display."""
-    items = InventoryItem.query.all()
-    return jsonify({'items': [item.to_dict(include_qr=True) for item in items]})
+    """Return one page of inventory grid columns, in id order after ?cursor=; QR images are fetched per row from /<id>/qr.png."""
+    per_page = min(request.args.get('per_page', 50, type=int), 500)
+    try:
+        rows, next_cursor = keyset_paginate(
+            db.session.query(
+                InventoryItem.id,
+                InventoryItem.sku,
+                InventoryItem.name,
+                InventoryItem.quantity,
+                Location.name
+            ).outerjoin(Location, InventoryItem.location_id == Location.id),
+            InventoryItem.id,
+            cursor=request.args.get('cursor'),
+            per_page=per_page
+        )
+    except ValueError:
+        abort(400, description='Invalid cursor')
+    # Build the blueprint URL once; per-row url_for dominated building large pages
+    qr_prefix = url_for('inventory.get_all_inventory', _external=True)
+    return jsonify({
+        'items': [{
+            'id': item_id,
+            'sku': sku,
+            'name': name,
+            'quantity': quantity,
+            'location': location,
+            'qr_code': f'{qr_prefix}{item_id}/qr.png'
+        } for item_id, sku, name, quantity, location in rows],
+        'pagination': get_keyset_pagination_info(per_page, next_cursor)
+    })
+
+@inventory_bp.route('/search', methods=['GET'])
+def search_inventory():
+    """Search active inventory items, streamed as one JSON summary per line (NDJSON)."""
+    criteria = InventoryItem.search_criteria(
+        request.args.get('q'),
+        request.args.get('category_id', type=int),
+        request.args.get('location_id', type=int)
+    )
+    
+    def generate():
+        for summary in InventoryItem.iter_summaries(*criteria):
+            yield current_app.json.dumps(summary) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @inventory_bp.route('/<int:item_id>/qr', methods=['GET'])
 def get_inventory_item_qr(item_id):
     """Return QR code image (base64) for a specific inventory item."""
     item = InventoryItem.query.get_or_404(item_id)
-    qr_base64 = item.get_qr_code_base64()
-    return jsonify({'qr_code': qr_base64, 'sku': item.sku, 'name': item.name})
+    etag = _etag(item.sku, item.name)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    response = jsonify({'qr_code': item.get_qr_code_base64(), 'sku': item.sku, 'name': item.name})
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+@inventory_bp.route('/<int:item_id>/qr.png', methods=['GET'])
+def get_inventory_item_qr_png(item_id):
+    """Return the QR code for a specific inventory item as a PNG image."""
+    sku = db.session.execute(db.select(InventoryItem.sku).where(InventoryItem.id == item_id)).scalar()
+    if sku is None:
+        abort(404)
+    etag = _etag(sku)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    return send_file(BytesIO(InventoryItem.get_qr_code_png(sku)), mimetype='image/png', max_age=86400, etag=etag)
+
+# Last rendered export per format: format -> (InventoryItem.get_export_version(), body)
+_export_cache = {}
 
 @inventory_bp.route('/export/csv', methods=['GET'])
 def export_inventory_csv():
-    """Export all inventory items as CSV."""
-    items = InventoryItem.query.all()
-    output = BytesIO()
-    writer = csv.writer(output)
-    # Write header
-    writer.writerow(['ID', 'SKU', 'Name', 'Description', 'Quantity', 'Location'])
-    # Write data
-    for item in items:
-        writer.writerow([
-            item.id,
-            item.sku,
-            item.name,
-            item.description or '',
-            item.quantity,
-            item.location or ''
-        ])
-    output.seek(0)
-    response = make_response(output.read())
+    """Export all inventory items as CSV, reusing the last export if nothing has changed since."""
+    version = InventoryItem.get_export_version()
+    etag = _etag('csv', version)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    cached = _export_cache.get('csv')
+    
+    def generate():
+        """Stream the CSV in batches as rows come off the cursor, keeping a copy for the cache"""
+        chunks = []
+        rows = db.session.execute(
+            db.select(
+                InventoryItem.id,
+                InventoryItem.sku,
+                InventoryItem.name,
+                InventoryItem.description,
+                InventoryItem.quantity,
+                Location.name
+            ).outerjoin(Location, InventoryItem.location_id == Location.id)
+            .order_by(InventoryItem.id)
+            .execution_options(yield_per=1000)
+        )
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['ID', 'SKU', 'Name', 'Description', 'Quantity', 'Location'])
+        for partition in rows.partitions():
+            writer.writerows(
+                (item_id, sku, name, description or '', quantity, location or '')
+                for item_id, sku, name, description, quantity, location in partition
+            )
+            chunks.append(buffer.getvalue())
+            yield chunks[-1]
+            buffer.seek(0)
+            buffer.truncate(0)
+        chunks.append(buffer.getvalue())
+        yield chunks[-1]
+        _export_cache['csv'] = (version, ''.join(chunks))
+    
+    if cached and cached[0] == version:
+        response = Response(cached[1], mimetype='text/csv')
+    else:
+        response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.set_etag(etag)
     response.headers['Content-Disposition'] = 'attachment; filename=inventory_export.csv'
-    response.headers['Content-Type'] = 'text/csv'
     return response
 
+@inventory_bp.route('/export/json', methods=['GET'])
+def export_inventory_json():
+    """Export all inventory items as JSON, streamed row by row without building the full list."""
+    def generate():
+        rows = db.session.execute(
+            db.select(
+                InventoryItem.id,
+                InventoryItem.sku,
+                InventoryItem.name,
+                InventoryItem.description,
+                InventoryItem.quantity,
+                Location.name.label('location')
+            ).outerjoin(Location, InventoryItem.location_id == Location.id)
+            .order_by(InventoryItem.id)
+            .execution_options(yield_per=500)
+        ).mappings()
+        yield b'{"items":['
+        separator = b''
+        for row in rows:
+            yield separator + orjson.dumps(dict(row))
+            separator = b','
+        yield b']}'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.headers['Content-Disposition'] = 'attachment; filename=inventory_export.json'
+    return response
+
+# x offset of each PDF column: ID, SKU, Name, Quantity, Location
+_PDF_COLUMNS = (40, 80, 180, 320, 400)
+_PDF_LINE_HEIGHT = 16
+_PDF_BOTTOM = 60
+
+def _draw_pdf_rows(p, y, rows):
+    """Draw a page of rows as one text object per column instead of one drawString per cell"""
+    for index, x in enumerate(_PDF_COLUMNS):
+        text = p.beginText(x, y)
+        text.setFont('Helvetica', 9)
+        text.setLeading(_PDF_LINE_HEIGHT)
+        text.textLines([row[index] for row in rows], trim=0)
+        p.drawText(text)
+
 @inventory_bp.route('/export/pdf', methods=['GET'])
 def export_inventory_pdf():
-    """Export all inventory items as PDF."""
-    items = InventoryItem.query.all()
+    """Export all inventory items as PDF, reusing the last export if nothing has changed since."""
+    version = InventoryItem.get_export_version()
+    etag = _etag('pdf', version)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    cached = _export_cache.get('pdf')
+    if cached and cached[0] == version:
+        body = cached[1]
+    else:
+        body = _render_inventory_pdf()
+        _export_cache['pdf'] = (version, body)
+    return send_file(BytesIO(body), as_attachment=True, download_name='inventory_export.pdf', mimetype='application/pdf', etag=etag)
+
+def _render_inventory_pdf():
+    """Render the inventory PDF and return its bytes"""
+    rows = [
+        (str(item_id), sku, name, str(quantity), location or '')
+        for item_id, sku, name, quantity, location in db.session.execute(
+            db.select(
+                InventoryItem.id,
+                InventoryItem.sku,
+                InventoryItem.name,
+                InventoryItem.quantity,
+                Location.name
+            ).outerjoin(Location, InventoryItem.location_id == Location.id)
+            .order_by(InventoryItem.id)
+        )
+    ]
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
@@ -63,17 +236,14 @@ def export_inventory_pdf():
     p.drawString(320, y, 'Quantity')
     p.drawString(400, y, 'Location')
     y -= 20
-    p.setFont('Helvetica', 9)
-    for item in items:
-        if y < 60:
-            p.showPage()
-            y = height - 40
-        p.drawString(40, y, str(item.id))
-        p.drawString(80, y, item.sku)
-        p.drawString(180, y, item.name)
-        p.drawString(320, y, str(item.quantity))
-        p.drawString(400, y, item.location or '')
-        y -= 16
+    start = 0
+    while True:
+        per_page = int((y - _PDF_BOTTOM) // _PDF_LINE_HEIGHT) + 1
+        _draw_pdf_rows(p, y, rows[start:start + per_page])
+        start += per_page
+        if start >= len(rows):
+            break
+        p.showPage()
+        y = height - 40
     p.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name='inventory_export.pdf', mimetype='application/pdf') 
\ No newline at end of file
+    return buffer.getvalue()
\ No newline at end of file
@@ -4,52 +4,71 @@ Handles business logic for inventory management operations
 """
 
 from typing import List, Dict, Optional
-from datetime import datetime
-from models import db, InventoryItem, Category, Location, AuditLog, Notification
-from utils.helpers import validate_required_fields, validate_numeric_range
+from sqlalchemy import insert
+from api.models import db, InventoryItem, Category, Location, AuditLog, Notification
+from utils.cache import cached, invalidate
+from utils.helpers import validate_required_fields, validate_numeric_range, encode_cursor, decode_cursor
+
+# Audit rows for inventory changes are staged in the same transaction as the change
+# (AuditLog.log_activity, no extra commit), so every committed stock movement has its
+# audit row. Request-level events (logins, denied access) go through utils.audit_queue.
+
+# Rows per INSERT statement in create_items_bulk
+BULK_BATCH_SIZE = 1000
+
+# Fields create_item and create_items_bulk require on every row
+REQUIRED_ITEM_FIELDS = ('sku', 'name', 'category_id', 'location_id', 'quantity', 'unit_price')
+
+# Fields update_item copies from the request body
+UPDATABLE_FIELDS = (
+    'name', 'description', 'category_id', 'location_id', 'unit_price',
+    'reorder_level', 'reorder_quantity', 'supplier_id', 'barcode'
+)
+
+# Dashboard results cached in Redis; dropped after every committed inventory change
+STOCK_CACHE_KEYS = ('inv:summary', 'inv:low_stock', 'inv:oos')
 
 class InventoryService:
     """Service class for inventory management operations"""
     
     @staticmethod
-    def get_all_items(page: int = 1, per_page: int = 20, search: str = None, 
+    def _validate_new_item(data: Dict):
+        """Raise ValueError if data is not a valid new inventory item"""
+        missing_fields = validate_required_fields(data, REQUIRED_ITEM_FIELDS)
+        if missing_fields:
+            raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+        
+        quantity_valid, quantity_msg = validate_numeric_range(data['quantity'], min_value=0)
+        if not quantity_valid:
+            raise ValueError(quantity_msg)
+        
+        price_valid, price_msg = validate_numeric_range(data['unit_price'], min_value=0)
+        if not price_valid:
+            raise ValueError(price_msg)
+    
+    @staticmethod
+    def get_all_items(cursor: str = None, per_page: int = 20, search: str = None, 
                      category_id: int = None, location_id: int = None) -> Dict:
-        """Get all inventory items with pagination and filtering"""
+        """Get one page of inventory items ordered by name, after the given cursor"""
         try:
-            query = InventoryItem.query.filter_by(is_active=True)
+            criteria = InventoryItem.search_criteria(search, category_id, location_id)
             
-            # Apply search filter
-            if search:
-                query = query.filter(
-                    db.or_(
-                        InventoryItem.name.ilike(f'%{search}%'),
-                        InventoryItem.sku.ilike(f'%{search}%'),
-                        InventoryItem.description.ilike(f'%{search}%')
-                    )
-                )
-            
-            # Apply category filter
-            if category_id:
-                query = query.filter(InventoryItem.category_id == category_id)
+            # Keyset pagination: seek past the previous page's last (name, id) instead of OFFSET,
+            # and fetch one extra row to learn whether another page follows
+            if cursor:
+                last_name, last_id = decode_cursor(cursor)
+                criteria.append(db.tuple_(InventoryItem.name, InventoryItem.id) > (last_name, last_id))
             
-            # Apply location filter
-            if location_id:
-                query = query.filter(InventoryItem.location_id == location_id)
-            
-            # Paginate results
-            pagination = query.order_by(InventoryItem.name).paginate(
-                page=page, per_page=per_page, error_out=False
-            )
+            items = list(InventoryItem.iter_summaries(*criteria, limit=per_page + 1))
+            has_next = len(items) > per_page
+            items = items[:per_page]
             
             return {
-                'items': [item.to_dict_summary() for item in pagination.items],
+                'items': items,
                 'pagination': {
-                    'page': pagination.page,
-                    'pages': pagination.pages,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'has_next': pagination.has_next,
-                    'has_prev': pagination.has_prev
+                    'per_page': per_page,
+                    'has_next': has_next,
+                    'next_cursor': encode_cursor(items[-1]['name'], items[-1]['id']) if has_next else None
                 }
             }
         
@@ -69,100 +88,124 @@ class InventoryService:
     def create_item(data: Dict, user_id: int) -> Dict:
         """Create new inventory item"""
         try:
-            # Validate required fields
-            required_fields = ['sku', 'name', 'category_id', 'location_id', 'quantity', 'unit_price']
-            missing_fields = validate_required_fields(data, required_fields)
-            if missing_fields:
-                raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
-            
-            # Validate numeric fields
-            quantity_valid, quantity_msg = validate_numeric_range(data['quantity'], min_value=0)
-            if not quantity_valid:
-                raise ValueError(quantity_msg)
+            InventoryService._validate_new_item(data)
             
-            price_valid, price_msg = validate_numeric_range(data['unit_price'], min_value=0)
-            if not price_valid:
-                raise ValueError(price_msg)
-            
-            # Check if SKU already exists
-            existing_item = InventoryItem.query.filter_by(sku=data['sku']).first()
-            if existing_item:
+            # Create new item; the unique SKU constraint replaces a separate existence check
+            new_item_id = InventoryItem.insert_unless_sku_exists({
+                'sku': data['sku'],
+                'name': data['name'],
+                'description': data.get('description'),
+                'category_id': data['category_id'],
+                'location_id': data['location_id'],
+                'quantity': data['quantity'],
+                'unit_price': data['unit_price'],
+                'reorder_level': data.get('reorder_level', 10),
+                'reorder_quantity': data.get('reorder_quantity', 50),
+                'supplier_id': data.get('supplier_id'),
+                'barcode': data.get('barcode'),
+                'created_by': user_id
+            })
+            if new_item_id is None:
                 raise ValueError("SKU already exists")
             
-            # Create new item
-            new_item = InventoryItem(
-                sku=data['sku'],
-                name=data['name'],
-                description=data.get('description'),
-                category_id=data['category_id'],
-                location_id=data['location_id'],
-                quantity=data['quantity'],
-                unit_price=data['unit_price'],
-                reorder_level=data.get('reorder_level', 10),
-                reorder_quantity=data.get('reorder_quantity', 50),
-                supplier_id=data.get('supplier_id'),
-                barcode=data.get('barcode'),
-                created_by=user_id
-            )
-            
-            db.session.add(new_item)
-            db.session.commit()
-            
             # Log the creation
             AuditLog.log_activity(
                 user_id=user_id,
                 action='create_inventory_item',
                 table_name='inventory_items',
-                record_id=new_item.id,
-                notes=f"Created inventory item: {new_item.name} (SKU: {new_item.sku})"
+                record_id=new_item_id,
+                notes=f"Created inventory item: {data['name']} (SKU: {data['sku']})"
             )
+            db.session.commit()
+            invalidate(*STOCK_CACHE_KEYS)
             
-            return new_item.to_dict()
+            return db.session.get(InventoryItem, new_item_id).to_dict()
         
         except Exception as e:
             db.session.rollback()
             raise Exception(f"Failed to create inventory item: {str(e)}")
     
+    @staticmethod
+    def create_items_bulk(data_list: List[Dict], user_id: int) -> List[Dict]:
+        """Create many inventory items and their audit rows in one transaction"""
+        try:
+            # Validate every row before writing any
+            for index, data in enumerate(data_list):
+                try:
+                    InventoryService._validate_new_item(data)
+                except ValueError as e:
+                    raise ValueError(f"Row {index}: {str(e)}")
+            
+            skus = [data['sku'] for data in data_list]
+            if len(set(skus)) != len(skus):
+                raise ValueError("Duplicate SKUs in request")
+            existing = db.session.execute(
+                db.select(InventoryItem.sku).where(InventoryItem.sku.in_(skus))
+            ).scalars().all()
+            if existing:
+                raise ValueError(f"SKU already exists: {', '.join(existing)}")
+            
+            rows = [{
+                'sku': data['sku'],
+                'name': data['name'],
+                'description': data.get('description'),
+                'category_id': data['category_id'],
+                'location_id': data['location_id'],
+                'quantity': data['quantity'],
+                'unit_price': data['unit_price'],
+                'reorder_level': data.get('reorder_level', 10),
+                'reorder_quantity': data.get('reorder_quantity', 50),
+                'supplier_id': data.get('supplier_id'),
+                'barcode': data.get('barcode'),
+                'created_by': user_id
+            } for data in data_list]
+            
+            # Multi-row INSERT ... RETURNING per batch, then the audit rows the same way
+            created = []
+            for start in range(0, len(rows), BULK_BATCH_SIZE):
+                created.extend(db.session.execute(
+                    insert(InventoryItem).returning(InventoryItem.id, InventoryItem.sku, InventoryItem.name),
+                    rows[start:start + BULK_BATCH_SIZE]
+                ).all())
+            
+            audit_rows = [{
+                'user_id': user_id,
+                'action': 'create_inventory_item',
+                'table_name': 'inventory_items',
+                'record_id': item_id,
+                'notes': f"Created inventory item: {name} (SKU: {sku})"
+            } for item_id, sku, name in created]
+            for start in range(0, len(audit_rows), BULK_BATCH_SIZE):
+                db.session.execute(insert(AuditLog), audit_rows[start:start + BULK_BATCH_SIZE])
+            
+            db.session.commit()
+            invalidate(*STOCK_CACHE_KEYS)
+            
+            return [{'id': item_id, 'sku': sku, 'name': name} for item_id, sku, name in created]
+        
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Failed to create inventory items: {str(e)}")
+    
     @staticmethod
     def update_item(item_id: int, data: Dict, user_id: int) -> Dict:
         """Update inventory item"""
         try:
-            item = InventoryItem.query.get(item_id)
+            # Validate numerics up front, then apply every change in one UPDATE ... RETURNING
+            for field in ('unit_price', 'reorder_level', 'reorder_quantity'):
+                if field in data:
+                    valid, msg = validate_numeric_range(data[field], min_value=0)
+                    if not valid:
+                        raise ValueError(msg)
+            
+            changes = {field: data[field] for field in UPDATABLE_FIELDS if field in data}
+            if changes:
+                item = InventoryItem.update_by_id(item_id, changes)
+            else:
+                item = db.session.get(InventoryItem, item_id)
             if not item:
                 raise ValueError("Inventory item not found")
             
-            # Update fields
-            if 'name' in data:
-                item.name = data['name']
-            if 'description' in data:
-                item.description = data['description']
-            if 'category_id' in data:
-                item.category_id = data['category_id']
-            if 'location_id' in data:
-                item.location_id = data['location_id']
-            if 'unit_price' in data:
-                price_valid, price_msg = validate_numeric_range(data['unit_price'], min_value=0)
-                if not price_valid:
-                    raise ValueError(price_msg)
-                item.unit_price = data['unit_price']
-            if 'reorder_level' in data:
-                level_valid, level_msg = validate_numeric_range(data['reorder_level'], min_value=0)
-                if not level_valid:
-                    raise ValueError(level_msg)
-                item.reorder_level = data['reorder_level']
-            if 'reorder_quantity' in data:
-                qty_valid, qty_msg = validate_numeric_range(data['reorder_quantity'], min_value=0)
-                if not qty_valid:
-                    raise ValueError(qty_msg)
-                item.reorder_quantity = data['reorder_quantity']
-            if 'supplier_id' in data:
-                item.supplier_id = data['supplier_id']
-            if 'barcode' in data:
-                item.barcode = data['barcode']
-            
-            item.updated_at = datetime.utcnow()
-            db.session.commit()
-            
             # Log the update
             AuditLog.log_activity(
                 user_id=user_id,
@@ -171,8 +214,11 @@ class InventoryService:
                 record_id=item.id,
                 notes=f"Updated inventory item: {item.name} (SKU: {item.sku})"
             )
+            result = item.to_dict()
+            db.session.commit()
+            invalidate(*STOCK_CACHE_KEYS)
             
-            return item.to_dict()
+            return result
         
         except Exception as e:
             db.session.rollback()
@@ -182,15 +228,10 @@ class InventoryService:
     def delete_item(item_id: int, user_id: int) -> bool:
         """Delete inventory item (soft delete)"""
         try:
-            item = InventoryItem.query.get(item_id)
+            item = InventoryItem.update_by_id(item_id, {'is_active': False})
             if not item:
                 raise ValueError("Inventory item not found")
             
-            # Soft delete
-            item.is_active = False
-            item.updated_at = datetime.utcnow()
-            db.session.commit()
-            
             # Log the deletion
             AuditLog.log_activity(
                 user_id=user_id,
@@ -199,6 +240,8 @@ class InventoryService:
                 record_id=item.id,
                 notes=f"Deleted inventory item: {item.name} (SKU: {item.sku})"
             )
+            db.session.commit()
+            invalidate(*STOCK_CACHE_KEYS)
             
             return True
         
@@ -210,20 +253,29 @@ class InventoryService:
     def add_stock(item_id: int, quantity: int, user_id: int, notes: str = None) -> Dict:
         """Add stock to inventory item"""
         try:
-            item = InventoryItem.query.get(item_id)
-            if not item:
-                raise ValueError("Inventory item not found")
-            
             # Validate quantity
             qty_valid, qty_msg = validate_numeric_range(quantity, min_value=1)
             if not qty_valid:
                 raise ValueError(qty_msg)
             
-            # Add stock
-            item.add_stock(quantity, user_id, notes)
+            # Add stock with quantity = quantity + n in the database, so concurrent calls cannot lose updates
+            item = InventoryItem.update_by_id(item_id, {'quantity': InventoryItem.quantity + quantity})
+            if not item:
+                raise ValueError("Inventory item not found")
+            previous = item.quantity - quantity
+            
+            AuditLog.log_activity(
+                user_id=user_id,
+                action='add_stock',
+                table_name='inventory_items',
+                record_id=item.id,
+                old_value=str(previous),
+                new_value=str(item.quantity),
+                notes=notes or f"Added {quantity} units"
+            )
             
             # Check if item was previously low stock
-            if item.quantity > item.reorder_level and item.quantity - quantity <= item.reorder_level:
+            if item.quantity > item.reorder_level and previous <= item.reorder_level:
                 # Create notification that stock is back to normal
                 Notification.create_notification(
                     user_id=user_id,
@@ -232,38 +284,61 @@ class InventoryService:
                     type="success"
                 )
             
-            return item.to_dict()
+            result = item.to_dict()
+            db.session.commit()
+            invalidate(*STOCK_CACHE_KEYS)
+            return result
         
         except Exception as e:
+            db.session.rollback()
             raise Exception(f"Failed to add stock: {str(e)}")
     
     @staticmethod
     def remove_stock(item_id: int, quantity: int, user_id: int, notes: str = None) -> Dict:
         """Remove stock from inventory item"""
         try:
-            item = InventoryItem.query.get(item_id)
-            if not item:
-                raise ValueError("Inventory item not found")
-            
             # Validate quantity
             qty_valid, qty_msg = validate_numeric_range(quantity, min_value=1)
             if not qty_valid:
                 raise ValueError(qty_msg)
             
-            # Remove stock
-            item.remove_stock(quantity, user_id, notes)
+            # Remove stock only if enough is on hand, checked and applied in the same UPDATE
+            item = InventoryItem.update_by_id(
+                item_id,
+                {'quantity': InventoryItem.quantity - quantity},
+                InventoryItem.quantity >= quantity
+            )
+            if not item:
+                if db.session.get(InventoryItem, item_id) is None:
+                    raise ValueError("Inventory item not found")
+                raise ValueError("Insufficient stock")
+            
+            AuditLog.log_activity(
+                user_id=user_id,
+                action='remove_stock',
+                table_name='inventory_items',
+                record_id=item.id,
+                old_value=str(item.quantity + quantity),
+                new_value=str(item.quantity),
+                notes=notes or f"Removed {quantity} units"
+            )
             
             # Check if item is now low stock
             if item.quantity <= item.reorder_level:
                 # Create low stock notification
                 Notification.create_low_stock_notification(item)
             
-            return item.to_dict()
+            result = item.to_dict()
+            db.session.commit()
+            invalidate(*STOCK_CACHE_KEYS)
+            return result
         
         except Exception as e:
+            db.session.rollback()
             raise Exception(f"Failed to remove stock: {str(e)}")
     
     @staticmethod
+    @cached('inv:summary')
     def get_inventory_summary() -> Dict:
         """Get inventory summary statistics"""
         try:
@@ -272,20 +347,20 @@ class InventoryService:
             raise Exception(f"Failed to get inventory summary: {str(e)}")
     
     @staticmethod
+    @cached('inv:low_stock')
     def get_low_stock_items() -> List[Dict]:
         """Get items with low stock"""
         try:
-            items = InventoryItem.get_low_stock_items()
-            return [item.to_dict_summary() for item in items]
+            return list(InventoryItem.iter_summaries(InventoryItem.quantity <= InventoryItem.reorder_level))
         except Exception as e:
             raise Exception(f"Failed to get low stock items: {str(e)}")
     
     @staticmethod
+    @cached('inv:oos')
     def get_out_of_stock_items() -> List[Dict]:
         """Get items that are out of stock"""
         try:
-            items = InventoryItem.get_out_of_stock_items()
-            return [item.to_dict_summary() for item in items]
+            return list(InventoryItem.iter_summaries(InventoryItem.quantity == 0))
         except Exception as e:
             raise Exception(f"Failed to get out of stock items: {str(e)}")
     
@@ -293,7 +368,6 @@ class InventoryService:
     def search_items(query: str, category_id: int = None, location_id: int = None) -> List[Dict]:
         """Search inventory items"""
         try:
-            items = InventoryItem.search_items(query, category_id, location_id)
-            return [item.to_dict_summary() for item in items]
+            return list(InventoryItem.iter_summaries(*InventoryItem.search_criteria(query, category_id, location_id)))
         except Exception as e:
             raise Exception(f"Failed to search items: {str(e)}") 
\ No newline at end of file
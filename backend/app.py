@@ -1,21 +1,31 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from datetime import datetime
+from sqlalchemy.orm import configure_mappers
 import os
+import time
+import atexit
+import itertools
+import queue
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import redis
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Import configuration
 from config.config import config
 
+# Shared SQLAlchemy instance the models are declared against
+from api.models import db
+from api.models.user import configure_password_hashing
+from utils.json_provider import OrjsonProvider
+from utils.audit_queue import audit_queue
+
 # Initialize extensions
-db = SQLAlchemy()
 migrate = Migrate()
 bcrypt = Bcrypt()
 jwt = JWTManager()
@@ -37,26 +47,43 @@ def create_celery(app):
                 return self.run(*args, **kwargs)
     
     celery.Task = ContextTask
+    
+    @worker_process_init.connect
+    def reset_db_pool(**kwargs):
+        # Forked workers must not reuse pooled connections inherited from the parent
+        with app.app_context():
+            db.engine.dispose(close=False)
+    
     return celery
 
 def create_app(config_name='development'):
     """Application factory pattern with enterprise features"""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     
     # Load configuration
     app.config.from_object(config[config_name])
     
     # Initialize extensions
     db.init_app(app)
+    # All models share one registry; configure it at startup rather than on the first query
+    configure_mappers()
     migrate.init_app(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    audit_queue.init_app(app)
+    configure_password_hashing(
+        app.config['PASSWORD_HASH_TIME_COST'],
+        app.config['PASSWORD_HASH_MEMORY_COST'],
+        app.config['PASSWORD_HASH_PARALLELISM']
+    )
     
     # Initialize Redis
     global redis_client
     try:
         redis_client = redis.from_url(app.config['REDIS_URL'])
         redis_client.ping()  # Test connection
+        app.extensions['redis'] = redis_client
     except Exception as e:
         app.logger.warning(f"Redis connection failed: {e}")
         redis_client = None
@@ -70,7 +97,8 @@ def create_app(config_name='development'):
          origins=app.config['CORS_ORIGINS'],
          supports_credentials=True,
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-         allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])
+         allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
+         max_age=app.config['CORS_MAX_AGE'])
     
     # Setup logging
     if not app.debug and not app.testing:
@@ -81,7 +109,12 @@ def create_app(config_name='development'):
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
         ))
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        # Request threads only enqueue records; a listener thread does the file writes and rotation
+        log_queue = queue.Queue(-1)
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        app.logger.addHandler(QueueHandler(log_queue))
         app.logger.setLevel(logging.INFO)
         app.logger.info('IPMS startup')
     
@@ -102,6 +135,34 @@ def create_app(config_name='development'):
     # app.register_blueprint(reports_bp, url_prefix='/api/reports')
     # app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
     
+    # Last service probe, reused for HEALTH_CHECK_TTL seconds so frequent
+    # load-balancer polls do not each cost a database and Redis round-trip
+    service_probe = {'checked_at': None, 'services': None}
+    
+    def probe_services():
+        now = time.monotonic()
+        if service_probe['checked_at'] is not None and now - service_probe['checked_at'] < app.config['HEALTH_CHECK_TTL']:
+            return service_probe['services']
+        
+        try:
+            db.session.execute(db.text('SELECT 1'))
+            database = 'connected'
+        except Exception:
+            db.session.rollback()
+            database = 'disconnected'
+        try:
+            redis_ok = redis_client is not None and redis_client.ping()
+        except Exception:
+            redis_ok = False
+        
+        service_probe['services'] = {
+            'database': database,
+            'redis': 'connected' if redis_ok else 'disconnected',
+            'celery': 'connected' if celery else 'disconnected'
+        }
+        service_probe['checked_at'] = now
+        return service_probe['services']
+    
     # Health check endpoint with comprehensive status
     @app.route('/api/health')
     def health_check():
@@ -110,15 +171,16 @@ def create_app(config_name='development'):
             'timestamp': datetime.utcnow().isoformat(),
             'version': '2.0.0',
             'environment': config_name,
-            'services': {
-                'database': 'connected' if db.engine.pool.checkedin() > 0 else 'disconnected',
-                'redis': 'connected' if redis_client and redis_client.ping() else 'disconnected',
-                'celery': 'connected' if celery else 'disconnected'
-            },
+            'services': probe_services(),
             'message': 'IPMS Enterprise Backend is running!'
         }
         return jsonify(health_status)
     
+    # Liveness probe: answers from memory, no I/O
+    @app.route('/api/livez')
+    def liveness_check():
+        return jsonify({'status': 'ok'})
+    
     # Root endpoint with API documentation
     @app.route('/')
     def root():
@@ -239,15 +301,19 @@ def create_app(config_name='development'):
             'timestamp': datetime.utcnow().isoformat()
         }), 403
     
-    # Request logging middleware
+    # Request logging middleware (sampled: 1 in REQUEST_LOG_SAMPLE_RATE requests per worker)
+    request_counter = itertools.count()
+    sample_rate = max(app.config['REQUEST_LOG_SAMPLE_RATE'], 1)
+    
     @app.before_request
     def log_request_info():
-        app.logger.info(f'{request.method} {request.url} - {request.remote_addr}')
+        if next(request_counter) % sample_rate == 0:
+            app.logger.info('%s %s - %s', request.method, request.url, request.remote_addr)
     
     return app
 
 # Create the application instance
-app = create_app()
+app = create_app(os.environ.get('FLASK_ENV') or 'development')
 
 if __name__ == '__main__':
     print("🚀 Starting IPMS Enterprise Backend Server...")
@@ -257,8 +323,9 @@ if __name__ == '__main__':
     print("📚 API Docs: http://localhost:5000/api/docs")
     print("=" * 60)
     
+    # Werkzeug's server is for local development only; production runs under gunicorn
     app.run(
         host='0.0.0.0',
         port=5000,
-        debug=True
+        debug=app.debug
     ) 
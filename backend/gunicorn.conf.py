@@ -0,0 +1,18 @@
+"""
+Gunicorn configuration
+Run with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count() * 2 + 1)
+
+# Threaded workers: each thread takes its own connection from the worker's SQLAlchemy pool
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+
+# No preload_app: create_app starts the audit-log writer and log listener threads,
+# which would not survive the fork into the workers
+preload_app = False
\ No newline at end of file
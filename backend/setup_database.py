@@ -58,39 +58,21 @@ def create_database():
         print(f"Error setting up database: {str(e)}")
         return False
 
-def test_connection():
-    """Test database connection"""
-    try:
-        conn = psycopg2.connect(
-            host="localhost",
-            port="5432",
-            database="ipms_db",
-            user="ipms_user",
-            password="ipms_password"
-        )
-        cursor = conn.cursor()
-        cursor.execute("SELECT version();")
-        version = cursor.fetchone()
-        print(f"Database connection successful!")
-        print(f"PostgreSQL version: {version[0]}")
-        
-        cursor.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"Database connection failed: {str(e)}")
-        return False
-
 def create_tables():
-    """Create database tables using Flask-SQLAlchemy"""
+    """Test the connection and create tables over one connection from the app's engine"""
     try:
         from app import create_app
-        from models import db
+        from api.models import db
         
         app = create_app()
         with app.app_context():
-            db.create_all()
+            # The version probe and the DDL share a connection, so setup pays for one handshake
+            with db.engine.begin() as conn:
+                version = conn.execute(db.text("SELECT version();")).scalar()
+                print(f"Database connection successful!")
+                print(f"PostgreSQL version: {version}")
+                
+                db.metadata.create_all(conn)
             print("Database tables created successfully!")
             return True
             
@@ -109,14 +91,8 @@ def main():
         print("Failed to create database. Please check your PostgreSQL installation.")
         return
     
-    # Step 2: Test connection
-    print("\nStep 2: Testing database connection...")
-    if not test_connection():
-        print("Failed to connect to database. Please check your configuration.")
-        return
-    
-    # Step 3: Create tables
-    print("\nStep 3: Creating database tables...")
+    # Step 2: Test connection and create tables
+    print("\nStep 2: Testing database connection and creating tables...")
     if not create_tables():
         print("Failed to create tables. Please check your application configuration.")
         return
@@ -0,0 +1,82 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from api.models import db
+from api.models.user import User
+
+@pytest.fixture
+def app():
+    """Testing app on a fresh in-memory SQLite database"""
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', email='admin@example.com', first_name='Ada', last_name='Admin', role='admin')
+    user.set_password('admin123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def admin_headers(admin):
+    return {'Authorization': f'Bearer {create_access_token(identity=admin.id)}'}
+
+@pytest.fixture
+def category(app):
+    from api.models.inventory import Category
+    category = Category(name='Grains')
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+@pytest.fixture
+def location(app):
+    from api.models.inventory import Location
+    location = Location(name='Nairobi Warehouse')
+    db.session.add(location)
+    db.session.commit()
+    return location
+
+@pytest.fixture
+def make_item(admin, category, location):
+    """Factory for active inventory items in the fixture category and location"""
+    from api.models.inventory import InventoryItem
+
+    def make_item(sku, name=None, quantity=100, unit_price=1, reorder_level=10):
+        item = InventoryItem(
+            sku=sku,
+            name=name or f'Item {sku}',
+            category_id=category.id,
+            location_id=location.id,
+            quantity=quantity,
+            unit_price=unit_price,
+            reorder_level=reorder_level,
+            created_by=admin.id
+        )
+        db.session.add(item)
+        db.session.commit()
+        return item
+    return make_item
+
+@pytest.fixture
+def supplier(admin):
+    from api.models.supplier import Supplier
+    supplier = Supplier(
+        company_name='Savanna Supplies',
+        contact_person='Wanjiru',
+        email='orders@savanna.example',
+        created_by=admin.id
+    )
+    db.session.add(supplier)
+    db.session.commit()
+    return supplier
\ No newline at end of file
@@ -0,0 +1,23 @@
+from api.models import db
+from api.models.audit_log import AuditLog
+
+def test_search_activity_pages_through_rows_sharing_a_timestamp(admin):
+    # One bulk insert in one transaction: every row gets the same server-default created_at
+    db.session.bulk_insert_mappings(AuditLog, [
+        {'user_id': admin.id, 'action': 'update', 'table_name': 'inventory_items', 'record_id': n,
+         'notes': f'restock batch {n}'}
+        for n in range(7)
+    ])
+    db.session.commit()
+    assert db.session.query(AuditLog.created_at).distinct().count() == 1
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = AuditLog.search_activity('restock', limit=3, cursor=cursor)
+        if not rows:
+            break
+        seen.extend(row.id for row in rows)
+
+    assert len(seen) == 7
+    assert seen == sorted(seen, reverse=True)
\ No newline at end of file
@@ -0,0 +1,16 @@
+def test_me_without_token_is_unauthorized(client):
+    response = client.get('/api/auth/me')
+    assert response.status_code == 401
+
+def test_me_with_malformed_token_is_rejected(client):
+    response = client.get('/api/auth/me', headers={'Authorization': 'Bearer not-a-jwt'})
+    assert response.status_code == 422
+
+def test_me_returns_current_user(client, admin, admin_headers):
+    response = client.get('/api/auth/me', headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()['user']['email'] == 'admin@example.com'
+
+def test_admin_route_requires_token(client):
+    response = client.get('/api/auth/users')
+    assert response.status_code == 401
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy import inspect
+
+from api.models import db
+from api.models.inventory import Category, Location
+
+def test_category_and_location_count_only_active_items(category, location, make_item):
+    make_item('RICE1')
+    make_item('BEAN1')
+    retired = make_item('OLD01')
+    retired.is_active = False
+    db.session.commit()
+
+    assert category.to_dict()['item_count'] == 2
+    assert location.to_dict()['item_count'] == 2
+    # The fallback counts in SQL rather than loading the collections
+    assert 'items' in inspect(category).unloaded
+    assert 'items' in inspect(location).unloaded
+
+    counts = dict(Category.get_active_categories_with_counts())
+    assert counts[category] == 2
+    counts = dict(Location.get_active_locations_with_counts())
+    assert counts[location] == 2
\ No newline at end of file
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from api.models import db
+from api.models.purchase_order import PurchaseOrder
+
+def make_order(admin, supplier):
+    order = PurchaseOrder(supplier_id=supplier.id, created_by=admin.id)
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+def test_add_item_totals_persisted_order(admin, supplier, make_item):
+    rice = make_item('RICE1')
+    beans = make_item('BEAN1')
+    order = make_order(admin, supplier)
+
+    order.add_item(rice.id, 3, Decimal('2.00'))
+    order.add_item(beans.id, 2, Decimal('4.50'))
+    db.session.commit()
+    assert order.total_amount == Decimal('15.00')
+
+    # A repeat line merges into the existing one
+    order.add_item(rice.id, 2, Decimal('2.00'))
+    db.session.commit()
+    assert order.total_amount == Decimal('19.00')
+    assert len(order.items) == 2
+
+def test_remove_item_recomputes_total(admin, supplier, make_item):
+    rice = make_item('RICE1')
+    beans = make_item('BEAN1')
+    order = make_order(admin, supplier)
+    order.add_item(rice.id, 2, Decimal('2.00'))
+    order.add_item(beans.id, 2, Decimal('7.50'))
+    db.session.commit()
+    assert order.total_amount == Decimal('19.00')
+
+    line = next(item for item in order.items if item.inventory_item_id == rice.id)
+    order.remove_item(line.id)
+    db.session.commit()
+    db.session.expire_all()
+
+    assert db.session.get(PurchaseOrder, order.id).total_amount == Decimal('15.00')
+
+def test_add_item_totals_unsaved_order(admin, supplier, make_item):
+    rice = make_item('RICE1')
+    order = PurchaseOrder(supplier_id=supplier.id, created_by=admin.id)
+    order.add_item(rice.id, 4, Decimal('2.25'))
+    assert order.total_amount == Decimal('9.00')
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Audit Log Queue
+Buffers audit log rows in-process and writes them in batches from a background thread
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+from api.models import db, AuditLog
+
+logger = logging.getLogger(__name__)
+
+def _request_origin():
+    """(remote_addr, User-Agent) of the current request, read once however many rows it audits"""
+    origin = getattr(g, '_audit_origin', None)
+    if origin is None:
+        origin = g._audit_origin = (request.remote_addr, request.headers.get('User-Agent'))
+    return origin
+
+class AuditQueue:
+    """Collects audit rows from request handlers and bulk-inserts them off the request path"""
+
+    def __init__(self):
+        self._queue = None
+        self._app = None
+        self._thread = None
+        self.enabled = False
+        self.batch_size = 100
+        self.flush_interval = 5.0
+
+    def init_app(self, app):
+        """Read AUDIT_LOG_* settings and start the writer thread"""
+        self._app = app
+        self.enabled = app.config.get('AUDIT_LOG_ASYNC', True)
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', 100)
+        self.flush_interval = app.config.get('AUDIT_LOG_FLUSH_INTERVAL', 5.0)
+        if self._queue is None:
+            self._queue = queue.Queue(maxsize=app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def put(self, user_id, action, table_name, record_id=None, old_value=None, new_value=None,
+            ip_address=None, user_agent=None, notes=None):
+        """Queue an audit row; takes the same arguments as AuditLog.log_activity.
+        ip_address and user_agent default to the current request's"""
+        if has_request_context() and (ip_address is None or user_agent is None):
+            request_ip, request_user_agent = _request_origin()
+            if ip_address is None:
+                ip_address = request_ip
+            if user_agent is None:
+                user_agent = request_user_agent
+        row = {
+            'user_id': user_id,
+            'action': action,
+            'table_name': table_name,
+            'record_id': record_id,
+            'old_value': old_value,
+            'new_value': new_value,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'notes': notes,
+            # Stamped now, not when the batch reaches the database
+            'created_at': datetime.now(timezone.utc)
+        }
+
+        if not self.enabled:
+            # Synchronous fallback: write in its own transaction
+            self._write([row])
+            return
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Backpressure: the writer is behind, so pay for this row on the request path
+            self._write([row])
+
+    def flush(self):
+        """Write everything currently queued (used at shutdown)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _run(self):
+        while True:
+            self._write(self._next_batch())
+
+    def _next_batch(self):
+        """Block for the first row, then collect until batch_size rows or flush_interval elapses"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            with self._app.app_context():
+                db.session.bulk_insert_mappings(AuditLog, batch)
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} audit log rows: {str(e)}")
+
+audit_queue = AuditQueue()
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Result Cache
+Caches JSON-serializable results in Redis so every worker shares them
+"""
+
+import functools
+import logging
+
+from flask import current_app
+from redis import RedisError
+
+logger = logging.getLogger(__name__)
+
+def _client():
+    """The app's Redis client, or None when Redis is unavailable"""
+    return current_app.extensions.get('redis')
+
+def cached(key, ttl=60):
+    """Decorator: serve the wrapped function's result from Redis under key for ttl seconds.
+    Falls through to the function whenever Redis is down"""
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            client = _client()
+            if client is None:
+                return f(*args, **kwargs)
+
+            try:
+                payload = client.get(key)
+                if payload is not None:
+                    return current_app.json.loads(payload)
+            except RedisError as e:
+                logger.warning(f"Cache read failed for {key}: {e}")
+                return f(*args, **kwargs)
+
+            result = f(*args, **kwargs)
+            try:
+                client.setex(key, ttl, current_app.json.dumps(result))
+            except RedisError as e:
+                logger.warning(f"Cache write failed for {key}: {e}")
+            return result
+
+        return decorated_function
+    return decorator
+
+def invalidate(*keys):
+    """Drop cached results; call after committing a change they depend on"""
+    client = _client()
+    if client is None:
+        return
+    try:
+        client.delete(*keys)
+    except RedisError as e:
+        logger.warning(f"Cache invalidation failed for {', '.join(keys)}: {e}")
\ No newline at end of file
@@ -1,104 +1,93 @@
+import logging
 from functools import wraps
-from flask import jsonify, request
+from flask import g, jsonify, request
 from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import SQLAlchemyError
+from api.models import db
 from api.models.user import User
-from api.models.audit_log import AuditLog
+from utils.audit_queue import audit_queue
+
+logger = logging.getLogger(__name__)
+
+def _get_current_user():
+    """The JWT user, loaded once per request and shared by stacked decorators"""
+    user = getattr(g, '_current_user', None)
+    if user is None:
+        user = g._current_user = User.get_by_id(get_jwt_identity())
+    return user
+
+def authorized(*, roles=None, permission=None, log_action=None, table_name=None, record_id=None):
+    """Decorator that checks role and/or permission and logs the call in a single wrapper
+
+    Replaces stacking role_required, permission_required and log_activity: one frame,
+    one identity read and one user load per request.
+    """
+    check_user = roles is not None or permission is not None
 
-def role_required(allowed_roles):
-    """Decorator to check if user has required role"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            try:
-                current_user_id = get_jwt_identity()
-                user = User.query.get(current_user_id)
-                
+            current_user_id = get_jwt_identity()
+
+            if check_user:
+                try:
+                    user = _get_current_user()
+                except SQLAlchemyError:
+                    logger.exception('User lookup failed for %s', request.endpoint)
+                    db.session.rollback()
+                    return jsonify({'error': 'Authorization failed'}), 500
+
                 if not user:
                     return jsonify({'error': 'User not found'}), 404
-                
+
                 if not user.is_active:
                     return jsonify({'error': 'Account is deactivated'}), 401
-                
-                if user.role not in allowed_roles:
+
+                if roles is not None and user.role not in roles:
                     # Log unauthorized access attempt
-                    AuditLog.log_activity(
+                    audit_queue.put(
                         user_id=current_user_id,
                         action='unauthorized_access',
                         table_name='api',
-                        notes=f"Unauthorized access attempt to {request.endpoint}",
-                        ip_address=request.remote_addr,
-                        user_agent=request.headers.get('User-Agent')
+                        notes=f"Unauthorized access attempt to {request.endpoint}"
                     )
                     return jsonify({'error': 'Insufficient permissions'}), 403
-                
-                return f(*args, **kwargs)
-            
-            except Exception as e:
-                return jsonify({'error': 'Authorization failed'}), 500
-        
-        return decorated_function
-    return decorator
 
-def permission_required(permission):
-    """Decorator to check if user has specific permission"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            try:
-                current_user_id = get_jwt_identity()
-                user = User.query.get(current_user_id)
-                
-                if not user:
-                    return jsonify({'error': 'User not found'}), 404
-                
-                if not user.is_active:
-                    return jsonify({'error': 'Account is deactivated'}), 401
-                
-                if not user.has_permission(permission):
+                if permission is not None and not user.has_permission(permission):
                     # Log unauthorized access attempt
-                    AuditLog.log_activity(
+                    audit_queue.put(
                         user_id=current_user_id,
                         action='unauthorized_access',
                         table_name='api',
-                        notes=f"Unauthorized access attempt to {request.endpoint} (permission: {permission})",
-                        ip_address=request.remote_addr,
-                        user_agent=request.headers.get('User-Agent')
+                        notes=f"Unauthorized access attempt to {request.endpoint} (permission: {permission})"
                     )
                     return jsonify({'error': 'Insufficient permissions'}), 403
-                
-                return f(*args, **kwargs)
-            
-            except Exception as e:
-                return jsonify({'error': 'Authorization failed'}), 500
-        
+
+            result = f(*args, **kwargs)
+
+            # Log the activity
+            if log_action and current_user_id:
+                audit_queue.put(
+                    user_id=current_user_id,
+                    action=log_action,
+                    table_name=table_name or 'api',
+                    record_id=record_id,
+                    notes=f"API call to {request.endpoint}"
+                )
+
+            return result
+
         return decorated_function
     return decorator
 
+def role_required(allowed_roles):
+    """Decorator to check if user has required role"""
+    return authorized(roles=allowed_roles)
+
+def permission_required(permission):
+    """Decorator to check if user has specific permission"""
+    return authorized(permission=permission)
+
 def log_activity(action, table_name=None, record_id=None):
     """Decorator to log user activity"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            try:
-                result = f(*args, **kwargs)
-                
-                # Log the activity
-                current_user_id = get_jwt_identity()
-                if current_user_id:
-                    AuditLog.log_activity(
-                        user_id=current_user_id,
-                        action=action,
-                        table_name=table_name or 'api',
-                        record_id=record_id,
-                        notes=f"API call to {request.endpoint}",
-                        ip_address=request.remote_addr,
-                        user_agent=request.headers.get('User-Agent')
-                    )
-                
-                return result
-            
-            except Exception as e:
-                return jsonify({'error': 'Operation failed'}), 500
-        
-        return decorated_function
-    return decorator 
\ No newline at end of file
+    return authorized(log_action=action, table_name=table_name, record_id=record_id)
\ No newline at end of file
@@ -1,57 +1,84 @@
 import os
-import uuid
-from datetime import datetime
+import time
+import functools
+import random
+import string
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
 from werkzeug.utils import secure_filename
 import re
 
+# Compiled once; the validators below run on every request that carries these fields
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_URL_RE = re.compile(r'^https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?)?$')
+_UNSAFE_FILENAME_RE = re.compile(r'[^a-zA-Z0-9._-]')
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+_CODE_ALPHABET = string.ascii_uppercase + string.digits
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+# Currencies format_currency prefixes with a symbol; any other code is appended after the amount
+_CURRENCY_SYMBOLS = {
+    'USD': '$',
+    'EUR': '€',
+    'GBP': '£',
+    'NGN': '₦',
+    'KES': 'KSh ',
+    'ZAR': 'R',
+    'XOF': 'CFA '
+}
+
 def allowed_file(filename, allowed_extensions):
-    """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in allowed_extensions
+    """Check if file extension is allowed (pass a set, e.g. ALLOWED_EXTENSIONS, for a hash lookup)"""
+    _, dot, file_ext = filename.rpartition('.')
+    return bool(dot) and file_ext.lower() in allowed_extensions
 
 def generate_filename(original_filename):
     """Generate unique filename"""
     # Get file extension
-    file_ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+    file_ext = original_filename.rpartition('.')[2].lower() if '.' in original_filename else ''
     
-    # Generate unique filename
-    unique_id = str(uuid.uuid4())
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Generate unique filename: hex nanosecond timestamp (sorts by upload time) plus 64 random bits
+    stem = f"{time.time_ns():x}_{os.urandom(8).hex()}"
     
     if file_ext:
-        return f"{timestamp}_{unique_id}.{file_ext}"
+        return f"{stem}.{file_ext}"
     else:
-        return f"{timestamp}_{unique_id}"
+        return stem
 
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return _EMAIL_RE.match(email) is not None
 
 def validate_phone(phone):
     """Validate phone number format"""
-    # Remove all non-digit characters
-    digits_only = re.sub(r'\D', '', phone)
+    # Count the digits (same set as \d) without building a digits-only copy
+    digit_count = sum(map(str.isdecimal, phone))
     
     # Check if it's a valid length (7-15 digits)
-    return 7 <= len(digits_only) <= 15
+    return 7 <= digit_count <= 15
 
 def validate_sku(sku):
     """Validate SKU format"""
-    # SKU should be alphanumeric and 3-20 characters
-    pattern = r'^[A-Za-z0-9]{3,20}$'
-    return re.match(pattern, sku) is not None
+    # SKU should be ASCII alphanumeric and 3-20 characters; str methods beat a regex at this size
+    return isinstance(sku, str) and 3 <= len(sku) <= 20 and sku.isascii() and sku.isalnum()
+
+def validate_skus_bulk(skus):
+    """Validate a batch of SKUs; returns one bool per SKU, in order"""
+    return [validate_sku(sku) for sku in skus]
+
+def validate_emails_bulk(emails):
+    """Validate a batch of emails; returns one bool per email, in order"""
+    match = _EMAIL_RE.match
+    return [match(email) is not None for email in emails]
 
 def format_currency(amount, currency='USD'):
     """Format currency amount"""
-    if currency == 'USD':
-        return f"${amount:,.2f}"
-    elif currency == 'EUR':
-        return f"€{amount:,.2f}"
-    elif currency == 'GBP':
-        return f"£{amount:,.2f}"
-    else:
-        return f"{amount:,.2f} {currency}"
+    symbol = _CURRENCY_SYMBOLS.get(currency)
+    if symbol:
+        return f"{symbol}{amount:,.2f}"
+    return f"{amount:,.2f} {currency}"
 
 def format_date(date_obj):
     """Format date object to string"""
@@ -90,52 +117,91 @@ def get_pagination_info(pagination):
         'prev_num': pagination.prev_num
     }
 
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque keyset cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor back into its sort key values"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+
+def keyset_paginate(query, cursor_col, cursor=None, per_page=20):
+    """Page through query in cursor_col order by seeking past the cursor, with no OFFSET or COUNT(*)
+    
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Use paginate_query instead where the caller needs page numbers and totals.
+    """
+    if cursor:
+        (last,) = decode_cursor(cursor)
+        query = query.filter(cursor_col > last)
+    
+    # Fetch one extra row to learn whether another page follows
+    rows = query.order_by(cursor_col).limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(getattr(rows[-1], cursor_col.key))
+
+def get_keyset_pagination_info(per_page, next_cursor):
+    """Get pagination information for a keyset_paginate page"""
+    return {
+        'per_page': per_page,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor
+    }
+
 def sanitize_filename(filename):
     """Sanitize filename for safe storage"""
     # Remove or replace unsafe characters
     filename = secure_filename(filename)
     
-    # Remove any remaining unsafe characters
-    filename = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
+    # Remove any remaining unsafe characters; secure_filename's output is normally
+    # already clean, so only pay for the substitution when a search finds one
+    if _UNSAFE_FILENAME_RE.search(filename):
+        filename = _UNSAFE_FILENAME_RE.sub('_', filename)
     
     return filename
 
 def get_file_size_mb(file_path):
     """Get file size in MB"""
     try:
-        size_bytes = os.path.getsize(file_path)
-        size_mb = size_bytes / (1024 * 1024)
-        return round(size_mb, 2)
+        return round(os.stat(file_path).st_size / 1048576, 2)
     except OSError:
         return 0
 
 def create_directory_if_not_exists(directory_path):
     """Create directory if it doesn't exist"""
-    if not os.path.exists(directory_path):
+    # Try the mkdir and let the OS report an existing directory, instead of a stat first
+    try:
         os.makedirs(directory_path)
         return True
-    return False
+    except FileExistsError:
+        return False
 
 def validate_required_fields(data, required_fields):
     """Validate that all required fields are present"""
-    missing_fields = []
-    for field in required_fields:
-        if field not in data or data[field] is None or data[field] == '':
-            missing_fields.append(field)
-    
-    return missing_fields
+    return [field for field in required_fields if data.get(field) in (None, '')]
 
 def validate_numeric_range(value, min_value=None, max_value=None):
     """Validate numeric value is within range"""
-    try:
-        num_value = float(value)
-        if min_value is not None and num_value < min_value:
-            return False, f"Value must be at least {min_value}"
-        if max_value is not None and num_value > max_value:
-            return False, f"Value must be at most {max_value}"
-        return True, None
-    except (ValueError, TypeError):
-        return False, "Value must be a number"
+    # Numbers (JSON payloads, Numeric columns) are compared as they are, without a
+    # float() copy that would also round Decimals; only strings and the like are parsed
+    if isinstance(value, (int, float, Decimal)):
+        num_value = value
+    else:
+        try:
+            num_value = float(value)
+        except (ValueError, TypeError):
+            return False, "Value must be a number"
+    
+    if min_value is not None and num_value < min_value:
+        return False, f"Value must be at least {min_value}"
+    if max_value is not None and num_value > max_value:
+        return False, f"Value must be at most {max_value}"
+    return True, None
 
 def validate_string_length(value, min_length=None, max_length=None):
     """Validate string length"""
@@ -150,9 +216,14 @@ def validate_string_length(value, min_length=None, max_length=None):
     
     return True, None
 
+@functools.lru_cache(maxsize=4)
+def _timestamp_prefix(epoch_second):
+    """Local YYYYmmdd_HHMMSS for a whole epoch second, so a burst within one second formats it once"""
+    return datetime.fromtimestamp(epoch_second).strftime('%Y%m%d_%H%M%S')
+
 def generate_report_filename(report_type, format='json'):
     """Generate filename for reports"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    timestamp = _timestamp_prefix(int(time.time()))
     return f"{report_type}_report_{timestamp}.{format}"
 
 def calculate_age(birth_date):
@@ -160,15 +231,12 @@ def calculate_age(birth_date):
     if not birth_date:
         return None
     
-    today = datetime.now().date()
+    today = date.today()
     if isinstance(birth_date, str):
-        birth_date = datetime.strptime(birth_date, '%Y-%m-%d').date()
+        birth_date = date.fromisoformat(birth_date)
     
-    age = today.year - birth_date.year
-    if today.month < birth_date.month or (today.month == birth_date.month and today.day < birth_date.day):
-        age -= 1
-    
-    return age
+    # Subtract one if this year's birthday is still ahead
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
 
 def truncate_text(text, max_length=100, suffix='...'):
     """Truncate text to specified length"""
@@ -182,38 +250,29 @@ def truncate_text(text, max_length=100, suffix='...'):
 
 def generate_unique_code(prefix='', length=8):
     """Generate unique alphanumeric code"""
-    import random
-    import string
-    
-    # Generate random alphanumeric string
-    chars = string.ascii_uppercase + string.digits
-    random_part = ''.join(random.choice(chars) for _ in range(length))
+    # Generate random alphanumeric string in one C-level call
+    random_part = ''.join(random.choices(_CODE_ALPHABET, k=length))
     
     return f"{prefix}{random_part}"
 
 def validate_url(url):
     """Validate URL format"""
-    pattern = r'^https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:[\w.])*)?)?$'
-    return re.match(pattern, url) is not None
+    return _URL_RE.match(url) is not None
 
 def clean_html_tags(text):
     """Remove HTML tags from text"""
-    if not text:
+    if not text or '<' not in text:
         return text
     
-    # Simple HTML tag removal
-    clean = re.compile('<.*?>')
-    return re.sub(clean, '', text)
+    # Simple HTML tag removal; [^>]* scans each tag once instead of backtracking like .*?
+    return _HTML_TAG_RE.sub('', text)
 
 def format_file_size(size_bytes):
     """Format file size in human readable format"""
     if size_bytes == 0:
         return "0B"
     
-    size_names = ["B", "KB", "MB", "GB", "TB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
+    # Unit index straight from the bit length (1024**i <= size < 1024**(i+1)), capped at TB
+    i = 0 if size_bytes < 1024 else min((int(size_bytes).bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
     
-    return f"{size_bytes:.1f}{size_names[i]}" 
\ No newline at end of file
+    return f"{size_bytes / (1 << (10 * i)):.1f}{_SIZE_UNITS[i]}" 
\ No newline at end of file
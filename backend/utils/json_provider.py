@@ -0,0 +1,30 @@
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+import orjson
+
+# datetime/date/UUID are handled natively by orjson; Decimal (Numeric columns)
+# and anything else fall through to _default
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _default(obj):
+    """Serialize types orjson does not handle natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, so models can hand raw
+    datetime/Decimal values to jsonify instead of formatting them per field"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=_OPTIONS),
+            mimetype='application/json'
+        )
\ No newline at end of file